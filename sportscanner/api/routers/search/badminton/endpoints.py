@@ -10,7 +10,7 @@ from starlette import status
 from starlette.responses import JSONResponse
 
 import sportscanner.storage.postgres.database as db
-from sportscanner.api.routers.search.badminton.schemas import SearchCriteria
+from sportscanner.api.routers.search.badminton.schemas import SearchCriteria, SortBy
 from sportscanner.api.routers.users.service.userService import UserService
 from sportscanner.core.security.authHandler import AuthHandler
 from sportscanner.crawlers.pipeline import *
@@ -73,17 +73,30 @@ async def search(
         composite_keys = [x["venue"]["composite_key"] for x in data]
 
     current_timestamp = datetime.now()
-    slots = db.get_all_rows(
-        engine,
-        db.SportScanner,
-        db.select(db.SportScanner)
-        .where(db.SportScanner.composite_key.in_(composite_keys))
-        .where(db.SportScanner.spaces > 0)  # Ignore empty courts
-        .where(db.SportScanner.starting_time >= filters.timeRange.starting)
-        .where(db.SportScanner.ending_time <= filters.timeRange.ending)
-        .where(db.SportScanner.date.in_(filters.dates))
-        .where(datetime_expr > current_timestamp)  # Ensures only future slots are returned
-    )
+    conditions = [
+        db.SportScanner.composite_key.in_(composite_keys),
+        db.SportScanner.spaces > 0,  # Ignore empty courts
+        db.SportScanner.starting_time >= filters.timeRange.starting,
+        db.SportScanner.ending_time <= filters.timeRange.ending,
+        db.SportScanner.date.in_(filters.dates),
+        datetime_expr > current_timestamp,  # Ensures only future slots are returned
+    ]
+    if filters.maxPrice is not None:
+        conditions.append(db.SportScanner.price_pence <= round(filters.maxPrice * 100))
+    slots = db.get_all_rows(engine, db.SportScanner, db.select(db.SportScanner).where(*conditions))
+    # Cheapest available slot of each venue and date, aggregated by the database
+    min_price_pence = {
+        (composite_key, slot_date): price_pence
+        for composite_key, slot_date, price_pence in db.get_all_rows(
+            engine,
+            db.SportScanner,
+            db.select(
+                db.SportScanner.composite_key, db.SportScanner.date, func.min(db.SportScanner.price_pence)
+            )
+            .where(*conditions)
+            .group_by(db.SportScanner.composite_key, db.SportScanner.date),
+        )
+    }
     grouped_slots = group_slots_by_attributes(
         slots, attributes=("composite_key", "date")
     )
@@ -91,7 +104,7 @@ async def search(
         x["venue"]["composite_key"]: x["distance"] for x in data
     }
     _response = sort_and_format_grouped_slots_for_ui(
-        grouped_slots, distance_from_venues_reference
+        grouped_slots, distance_from_venues_reference, min_price_pence
     )
     # Function to sort the list
     sorted_response = sorted(
@@ -101,6 +114,9 @@ async def search(
             x["distance"],  # Shortest location
         ),
     )
+    if filters.sortBy == SortBy.PRICE:
+        # Stable, so equally priced results keep the date/distance order; unpriced ones go last
+        sorted_response.sort(key=lambda x: (x["minPricePence"] is None, x["minPricePence"] or 0))
     return {
         "success": True,
         "resultId": f"e34f27a2-d591-486c-9a38-11111",
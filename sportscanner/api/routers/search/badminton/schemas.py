@@ -1,4 +1,5 @@
 from datetime import date, datetime, time
+from enum import Enum
 from typing import List, Optional
 
 from pydantic import BaseModel
@@ -14,6 +15,11 @@ class TimeFilter(BaseModel):
     ending: time
 
 
+class SortBy(str, Enum):
+    DATE = "date"  # Closest date, then shortest distance
+    PRICE = "price"  # Cheapest available slot per venue and date first, then closest date and distance
+
+
 class SearchCriteria(BaseModel):
     postcode: str
     sport: str
@@ -21,3 +27,5 @@ class SearchCriteria(BaseModel):
     timeRange: TimeFilter
     radius: float
     analytics: Optional[AnalyticsCriteria] = None
+    maxPrice: Optional[float] = None  # Pounds; slots without a known price are left out when set
+    sortBy: SortBy = SortBy.DATE
@@ -1,41 +1,47 @@
+import asyncio
+import contextlib
 import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import httpx
+from loguru import logger as logging
 
+from sportscanner.crawlers.traffic import wrap_transport
 from sportscanner.variables import settings
 
-proxies = {
-    "http://": settings.ROTATING_PROXY_ENDPOINT,
-    "https://": settings.ROTATING_PROXY_ENDPOINT,
-}
+
+def httpxClientLimits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTPX_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTPX_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTPX_CLIENT_KEEPALIVE_EXPIRY,
+    )
+
+
+def httpxClientTimeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        timeout=settings.HTTPX_CLIENT_TIMEOUT,
+        connect=10.0,  # Max time to establish a connection
+        read=10.0,     # Max time to read a response
+    )
 
 
 def httpxAsyncClientWithProxyRotation() -> httpx.AsyncClient:
     return httpx.AsyncClient(
-        limits=httpx.Limits(
-            max_connections=settings.HTTPX_CLIENT_MAX_CONNECTIONS,
-            max_keepalive_connections=settings.HTTPX_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
-        ),
-        timeout=httpx.Timeout(
-            timeout=settings.HTTPX_CLIENT_TIMEOUT,
-            connect=10.0,  # Max time to establish a connection
-            read=10.0,     # Max time to read a response
-        ),
-        proxies=proxies,
+        limits=httpxClientLimits(),
+        timeout=httpxClientTimeout(),
+        proxy=settings.ROTATING_PROXY_ENDPOINT,
     )
 
 
 def httpxAsyncClientWithoutProxyRotation() -> httpx.AsyncClient:
     return httpx.AsyncClient(
-        limits=httpx.Limits(
-            max_connections=settings.HTTPX_CLIENT_MAX_CONNECTIONS,
-            max_keepalive_connections=settings.HTTPX_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
-        ),
-        timeout=httpx.Timeout(
-            timeout=settings.HTTPX_CLIENT_TIMEOUT,
-            connect=10.0,  # Max time to establish a connection
-            read=10.0,     # Max time to read a response
-        ),
+        limits=httpxClientLimits(),
+        timeout=httpxClientTimeout(),
     )
 
 
@@ -46,3 +52,277 @@ def httpxAsyncClient() -> httpx.AsyncClient:
         if settings.USE_PROXIES
         else httpxAsyncClientWithoutProxyRotation()
     )
+
+
+# Statuses meaning the egress IP itself is refused, rather than the request being bad
+PROXY_BLOCKED_STATUS_CODES = {403, 407, 429}
+
+
+class ProxyHealth:
+    """Latency (EWMA) and recent outcomes of a single proxy"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None  # Seconds, exponentially weighted
+        self.outcomes: Deque[bool] = deque(maxlen=settings.PROXY_POOL_WINDOW)
+        self.evicted_at: Optional[float] = None
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+
+class ProxyPool:
+    """Routes requests over several proxies, preferring healthy fast ones
+
+    Each request goes to the faster of two randomly picked healthy proxies, so load still
+    spreads across the pool while slow ones get less of it. Proxies whose recent error rate
+    passes `PROXY_POOL_MAX_ERROR_RATE` are evicted for `PROXY_POOL_EVICTION` seconds and only
+    re-admitted after passing a health probe, which runs as a single background task per pool
+    """
+
+    def __init__(self, urls: List[str]):
+        self.proxies: Dict[str, ProxyHealth] = {url: ProxyHealth(url) for url in urls}
+        self.evictions: int = 0
+        self.probe_task: Optional[asyncio.Task] = None
+
+    def healthy(self) -> List[ProxyHealth]:
+        return [proxy for proxy in self.proxies.values() if proxy.evicted_at is None]
+
+    def choose(self) -> ProxyHealth:
+        """Power of two choices on latency; unmeasured proxies are tried first. When every
+        proxy is evicted, the one evicted longest ago is used rather than failing outright"""
+        candidates = self.healthy()
+        if not candidates:
+            return min(self.proxies.values(), key=lambda proxy: proxy.evicted_at)
+        picks = random.sample(candidates, min(2, len(candidates)))
+        return min(picks, key=lambda proxy: -1.0 if proxy.latency is None else proxy.latency)
+
+    def record(self, proxy: ProxyHealth, ok: bool, latency: Optional[float] = None):
+        proxy.record(ok, latency)
+        if (
+            proxy.evicted_at is None
+            and len(proxy.outcomes) >= settings.PROXY_POOL_MIN_REQUESTS
+            and proxy.error_rate > settings.PROXY_POOL_MAX_ERROR_RATE
+        ):
+            proxy.evicted_at = time.monotonic()
+            self.evictions += 1
+            logging.warning(f"Evicting proxy {proxy.url}: {proxy.error_rate:.0%} of recent requests failed")
+
+    def readmit(self, proxy: ProxyHealth):
+        logging.info(f"Proxy {proxy.url} passed its health probe, re-admitting")
+        proxy.evicted_at = None
+        proxy.outcomes.clear()
+
+    def due_for_probe(self) -> List[ProxyHealth]:
+        now = time.monotonic()
+        return [
+            proxy for proxy in self.proxies.values()
+            if proxy.evicted_at is not None and now - proxy.evicted_at >= settings.PROXY_POOL_EVICTION
+        ]
+
+    def schedule_probes(self, probe: Callable[[ProxyHealth], Awaitable[None]]):
+        """Starts probing the proxies due for it in the background, unless a probe is running"""
+        if self.probe_task is not None and not self.probe_task.done():
+            return
+        due = self.due_for_probe()
+        if due:
+            self.probe_task = asyncio.get_running_loop().create_task(self.probe(due, probe))
+
+    async def probe(self, proxies: List[ProxyHealth], probe: Callable[[ProxyHealth], Awaitable[None]]):
+        await asyncio.gather(*(probe(proxy) for proxy in proxies))
+
+    async def cancel_probes(self):
+        """Stops a running probe before its loop (and the transports it uses) close; proxies
+        still due are probed on the next run"""
+        task, self.probe_task = self.probe_task, None
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            proxy.url: {
+                "healthy": proxy.evicted_at is None,
+                "latency_s": round(proxy.latency, 3) if proxy.latency is not None else None,
+                "error_rate": round(proxy.error_rate, 2),
+            }
+            for proxy in self.proxies.values()
+        }
+
+
+def proxy_urls() -> List[str]:
+    return [url.strip() for url in (settings.PROXY_POOL or "").split(",") if url.strip()]
+
+
+_proxyPool: Optional[ProxyPool] = None
+
+
+def get_proxy_pool() -> Optional[ProxyPool]:
+    """Process-wide pool of `PROXY_POOL` proxies, so health survives across runs; None without one"""
+    global _proxyPool
+    if _proxyPool is None and settings.USE_PROXIES and proxy_urls():
+        _proxyPool = ProxyPool(proxy_urls())
+    return _proxyPool
+
+
+class ProxyPoolTransport(httpx.AsyncBaseTransport):
+    """Sends each request through the proxy the pool picks, recording latency and outcome"""
+
+    def __init__(self, pool: ProxyPool):
+        self.pool = pool
+        self.transports: Dict[str, httpx.AsyncHTTPTransport] = {
+            url: httpx.AsyncHTTPTransport(
+                limits=httpxClientLimits(), http2=settings.HTTPX_CLIENT_HTTP2, proxy=url
+            )
+            for url in pool.proxies
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.pool.schedule_probes(self.probe_proxy)
+        proxy = self.pool.choose()
+        tic = time.perf_counter()
+        try:
+            response = await self.transports[proxy.url].handle_async_request(request)
+        except httpx.TransportError:
+            self.pool.record(proxy, ok=False)
+            raise
+        self.pool.record(
+            proxy,
+            ok=response.status_code not in PROXY_BLOCKED_STATUS_CODES,
+            latency=time.perf_counter() - tic,
+        )
+        return response
+
+    async def probe_proxy(self, proxy: ProxyHealth):
+        request = httpx.Request("GET", settings.PROXY_POOL_HEALTHCHECK_URL)
+        tic = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.transports[proxy.url].handle_async_request(request), timeout=settings.HTTPX_CLIENT_TIMEOUT
+            )
+            await response.aread()
+            await response.aclose()
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            logging.debug(f"Health probe through proxy {proxy.url} failed: {e!r}")
+            proxy.evicted_at = time.monotonic()  # Stays evicted for another period
+            return
+        if response.status_code == 200:
+            proxy.latency = time.perf_counter() - tic
+            self.pool.readmit(proxy)
+        else:
+            proxy.evicted_at = time.monotonic()
+
+    async def aclose(self):
+        for transport in self.transports.values():
+            await transport.aclose()
+
+
+class ConnectionReuseStats:
+    """Counts requests sent on a kept-alive pooled connection against those that had to open
+    one, from httpcore's trace events; replayed requests never reach a connection and are not
+    counted"""
+
+    def __init__(self):
+        self.reused: int = 0
+        self.opened: int = 0
+
+    async def trace_request(self, request: httpx.Request):
+        """httpx request hook giving each request its own httpcore trace"""
+        connecting, counted = False, False
+
+        async def trace(event_name: str, info: dict):
+            nonlocal connecting, counted
+            if event_name == "connection.connect_tcp.started":
+                connecting = True
+            elif event_name.endswith(".send_request_headers.started") and not counted:
+                # Only the first request on the wire counts, e.g. a proxy's CONNECT
+                counted = True
+                if connecting:
+                    self.opened += 1
+                else:
+                    self.reused += 1
+
+        request.extensions["trace"] = trace
+
+
+class HttpxClientRegistry:
+    """Keeps one long-lived keep-alive connection pool per provider host
+
+    httpx clients are bound to the event loop their connections were opened on, so a
+    client is only reused while that loop is alive; a new loop (e.g. a fresh `asyncio.run`)
+    transparently gets a new pool and the stale one is discarded. `stats` reports how many
+    requests reused a pooled connection rather than paying a new TCP/TLS handshake
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+        self.clients_opened: int = 0
+        self.connections = ConnectionReuseStats()
+
+    def _create_client(self, host: str) -> httpx.AsyncClient:
+        logging.debug(f"Opening pooled httpx client for host: {host}")
+        proxy_pool = get_proxy_pool()
+        if proxy_pool is not None:
+            transport = ProxyPoolTransport(proxy_pool)
+        else:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpxClientLimits(),
+                http2=settings.HTTPX_CLIENT_HTTP2,
+                proxy=settings.ROTATING_PROXY_ENDPOINT if settings.USE_PROXIES else None,
+            )
+        return httpx.AsyncClient(
+            timeout=httpxClientTimeout(),
+            transport=wrap_transport(transport),
+            event_hooks={"request": [self.connections.trace_request]},
+        )
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """Returns the pooled client for the host of `url` (bare hostnames are accepted too)"""
+        host = urlsplit(url).netloc or url
+        loop = asyncio.get_running_loop()
+        pooled: Optional[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = self._clients.get(host)
+        if pooled is not None:
+            pooled_loop, client = pooled
+            if pooled_loop is loop and not client.is_closed:
+                return client
+        self.clients_opened += 1
+        client = self._create_client(host)
+        self._clients[host] = (loop, client)
+        return client
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hosts": len(self._clients),
+            "clients_opened": self.clients_opened,
+            "connections_opened": self.connections.opened,
+            "connections_reused": self.connections.reused,
+        }
+
+    async def aclose(self):
+        """Closes every pool opened on the running loop; pools from dead loops are dropped"""
+        loop = asyncio.get_running_loop()
+        logging.info(f"Closing pooled httpx clients: {self.stats()}")
+        proxy_pool = get_proxy_pool()
+        if proxy_pool is not None:
+            await proxy_pool.cancel_probes()
+            logging.info(f"Proxy pool health: {proxy_pool.stats()}")
+        for host, (pooled_loop, client) in list(self._clients.items()):
+            if pooled_loop is loop:
+                await client.aclose()
+            del self._clients[host]
+
+
+clientRegistry = HttpxClientRegistry()
+
+
+def httpxPooledClient(url: str) -> httpx.AsyncClient:
+    """Pooled client shared across all crawls in the process for the host of `url`"""
+    return clientRegistry.get_client(url)
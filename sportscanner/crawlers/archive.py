@@ -0,0 +1,230 @@
+"""Append-only archive of raw provider payloads, and reprocessing of it without recrawling
+
+Every payload handed to a parser during a refresh is kept, together with the parser and its
+arguments, in gzip JSONL files partitioned as
+`<CRAWLER_ARCHIVE_DIR>/date=<crawl date>/provider=<provider>/run=<run id>.jsonl.gz`.
+Each record is appended to its partition as soon as it is parsed, so a run that crashes keeps
+every payload it fetched. Parser arguments are stored as JSON (models via `model_dump`), so
+archives stay readable when the code that wrote them changes.
+`reprocess` re-parses the latest payload of every request key and reloads the resulting slots,
+e.g. after a parser fix:
+
+    python sportscanner/crawlers/archive.py [--since YYYY-MM-DD]
+"""
+
+import argparse
+import base64
+import dataclasses
+import gzip
+import importlib
+import json
+import os
+import zlib
+from contextvars import ContextVar, Token
+from datetime import date, datetime
+from glob import glob
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger as logging
+from pydantic import BaseModel
+
+from sportscanner.variables import settings
+
+
+def qualified_name(obj: Callable) -> str:
+    """`module:qualname` of a module-level function or class"""
+    return f"{obj.__module__}:{obj.__qualname__}"
+
+
+def resolve_qualified_name(reference: str) -> Callable:
+    module, qualname = reference.split(":")
+    return getattr(importlib.import_module(module), qualname)
+
+
+def encode_argument(value: Any) -> Any:
+    """JSON-compatible form of a parser argument: models, dataclasses, dates and containers are
+    tagged with their type, so `decode_argument` can rebuild them"""
+    if isinstance(value, BaseModel):
+        return {"__model__": qualified_name(type(value)), "fields": value.model_dump(mode="json")}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        fields = {field.name: encode_argument(getattr(value, field.name)) for field in dataclasses.fields(value)}
+        return {"__dataclass__": qualified_name(type(value)), "fields": fields}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, (tuple, frozenset, set)):
+        return {f"__{type(value).__name__}__": [encode_argument(item) for item in value]}
+    if isinstance(value, dict):
+        return {"__dict__": [[encode_argument(key), encode_argument(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [encode_argument(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Cannot archive parser argument of type {type(value).__name__}")
+
+
+def decode_argument(value: Any) -> Any:
+    if isinstance(value, list):
+        return [decode_argument(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "__model__" in value:
+        return resolve_qualified_name(value["__model__"]).model_validate(value["fields"])
+    if "__dataclass__" in value:
+        fields = {name: decode_argument(item) for name, item in value["fields"].items()}
+        return resolve_qualified_name(value["__dataclass__"])(**fields)
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    if "__dict__" in value:
+        return {decode_argument(key): decode_argument(item) for key, item in value["__dict__"]}
+    for container in (tuple, frozenset, set):
+        if f"__{container.__name__}__" in value:
+            return container(decode_argument(item) for item in value[f"__{container.__name__}__"])
+    raise ValueError(f"Unknown archived argument: {sorted(value)}")
+
+
+def provider_of(parser: Callable) -> str:
+    """`sportscanner.crawlers.parsers.<provider>.crawler` -> `<provider>`"""
+    parts = parser.__module__.split(".")
+    return parts[-2] if len(parts) >= 2 else parts[-1]
+
+
+class RawPayloadArchive:
+    """Appends one run's payloads to a gzip stream per provider partition, opened on first use"""
+
+    def __init__(self, directory: str, started_at: Optional[datetime] = None):
+        self.directory = directory
+        self.started_at = started_at or datetime.now()
+        self.run_id = self.started_at.strftime("%Y%m%dT%H%M%S")
+        self._streams: Dict[str, gzip.GzipFile] = {}
+        self._paths: Dict[str, str] = {}
+        self.archived = 0
+
+    @classmethod
+    def for_run(cls, started_at: Optional[datetime] = None) -> Optional["RawPayloadArchive"]:
+        """None when archiving is disabled by leaving `CRAWLER_ARCHIVE_DIR` empty"""
+        if not settings.CRAWLER_ARCHIVE_DIR:
+            return None
+        return cls(settings.CRAWLER_ARCHIVE_DIR, started_at)
+
+    def partition_path(self, provider: str) -> str:
+        crawl_date = self.started_at.date().isoformat()
+        return os.path.join(self.directory, f"date={crawl_date}", f"provider={provider}", f"run={self.run_id}.jsonl.gz")
+
+    def _stream(self, provider: str) -> gzip.GzipFile:
+        if provider not in self._streams:
+            path = self.partition_path(provider)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._streams[provider] = gzip.open(path, "ab")
+            self._paths[provider] = path
+        return self._streams[provider]
+
+    def add(self, parser: Callable, content: bytes, args: Tuple[Any, ...], source_key: Optional[str]):
+        """Appends the raw `content` plus what is needed to call `parser(content, *args, source_key)` again"""
+        record = {
+            "source_key": source_key,
+            "parser": qualified_name(parser),
+            "content": base64.b64encode(content).decode("ascii"),
+            "args": encode_argument(list(args)),
+            "archived_at": datetime.now().isoformat(),
+        }
+        stream = self._stream(provider_of(parser))
+        stream.write((json.dumps(record) + "\n").encode("utf-8"))
+        # A sync flush keeps the file readable up to this record if the run dies before `close`
+        stream.flush(zlib.Z_SYNC_FLUSH)
+        self.archived += 1
+
+    def close(self) -> List[str]:
+        """Finishes every partition's stream; returns the paths written"""
+        for stream in self._streams.values():
+            stream.close()
+        paths = list(self._paths.values())
+        logging.info(f"Archived {self.archived} raw payloads across {len(paths)} partitions of run {self.run_id}")
+        self._streams.clear()
+        self._paths.clear()
+        return paths
+
+
+_active_archive: ContextVar[Optional[RawPayloadArchive]] = ContextVar("active_archive", default=None)
+
+
+def activate(archive: Optional[RawPayloadArchive]) -> Token:
+    """Archives the payloads parsed by crawls started from the current context"""
+    return _active_archive.set(archive)
+
+
+def active_archive() -> Optional[RawPayloadArchive]:
+    return _active_archive.get()
+
+
+def iter_records(directory: str, since: Optional[date] = None) -> Iterator[Dict]:
+    """Archived records in run order, oldest first, from partitions crawled on/after `since`"""
+    paths = glob(os.path.join(directory, "date=*", "provider=*", "run=*.jsonl.gz"))
+    if since is not None:
+        paths = [path for path in paths if path.split("date=")[1][:10] >= since.isoformat()]
+    for path in sorted(paths, key=lambda path: os.path.basename(path)):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            try:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+            except (EOFError, json.JSONDecodeError) as e:
+                # Partitions of a run that died before `close` end mid-stream; their records so far are intact
+                logging.warning(f"Archive partition {path} is truncated, read up to: {e}")
+
+
+def latest_records(directory: str, since: Optional[date] = None) -> List[Dict]:
+    """Most recent payload per request key; payloads without a key are all kept"""
+    latest: Dict[str, Dict] = {}
+    unkeyed: List[Dict] = []
+    for record in iter_records(directory, since):
+        if record["source_key"] is None:
+            unkeyed.append(record)
+        else:
+            latest[record["source_key"]] = record
+    return list(latest.values()) + unkeyed
+
+
+def reparse(record: Dict, refreshed_at: datetime):
+    """Runs the archived parser again, stamping its `SlotBatch` with `refreshed_at`"""
+    from sportscanner.crawlers.parsers.batch import SlotBatch  # Keeps the executor-loaded imports light
+
+    parser = resolve_qualified_name(record["parser"])
+    args = decode_argument(record["args"])
+    slots = parser(base64.b64decode(record["content"]), *args, record["source_key"])
+    return SlotBatch.of(slots).restamp(refreshed_at)
+
+
+def reprocess(since: Optional[date] = None) -> int:
+    """Re-parses the latest archived payload of every request key and replaces their rows
+
+    Like a refresh, it ends with `finalize`: rows not rebuilt from the archive (request keys
+    last crawled before `since`, or whose payload no longer parses) and past dates are swept,
+    so the table reflects exactly what the archive holds. Slots are stamped with the time of
+    reprocessing, which is when they were last derived, and keeps them clear of that sweep
+    """
+    import sportscanner.storage.postgres.database as db
+
+    records = latest_records(settings.CRAWLER_ARCHIVE_DIR, since)
+    logging.info(f"Reprocessing {len(records)} archived payloads from: {settings.CRAWLER_ARCHIVE_DIR}")
+    writer = db.SlotStreamWriter(db.engine)
+    for record in records:
+        try:
+            slots = reparse(record, writer.started_at)  # Past dates are swept by `finalize`
+        except Exception as e:
+            logging.error(f"Unable to reprocess payload for {record['source_key']}: {e}")
+            continue
+        if slots:
+            writer.write(slots)
+    writer.finalize()
+    logging.success(f"Reprocessed archive into {writer.written} slots")
+    return writer.written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild slots from archived raw provider payloads")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="Oldest crawl date to read")
+    reprocess(parser.parse_args().since)
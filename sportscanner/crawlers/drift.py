@@ -0,0 +1,239 @@
+"""Sampled strict validation of provider payloads, reporting schema drift
+
+Parsers only decode the fields they need (see `CRAWLER_STRICT_DECODING`), so a provider adding,
+dropping or retyping fields would go unnoticed. During a refresh, the first response of every
+provider and a sample of the rest are also validated against the provider's full schema.
+Since those schemas do not declare every field either, the fields of sampled records (nested ones
+as dotted paths) are also compared with those seen in previous refreshes, persisted per provider.
+Findings are summarised per provider at the end of the run
+"""
+
+import asyncio
+import functools
+import importlib
+import json
+import random
+from collections import Counter
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from loguru import logger as logging
+from prefect.artifacts import create_table_artifact
+from pydantic import BaseModel, ValidationError
+
+import sportscanner.storage.postgres.database as db
+from sportscanner.variables import settings
+
+
+@dataclass(frozen=True)
+class ValidationPolicy:
+    schema: Optional[str] = None  # "module:Class" of the full record schema; None skips the provider
+    sample_rate: float = 0.01  # Fraction of responses validated after the first one
+
+
+# Per-provider policies are declared in `sportscanner.crawlers.providers`
+DEFAULT_VALIDATION_POLICY = ValidationPolicy()
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_schema(reference: str) -> type[BaseModel]:
+    module, name = reference.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def payload_records(payload: Any) -> List[Dict]:
+    """Records of a decoded payload: a list, the values of a keyed object, or either under `data`"""
+    if isinstance(payload, dict) and "data" in payload:
+        payload = payload["data"]
+    if isinstance(payload, dict):
+        payload = list(payload.values())
+    return [record for record in payload if isinstance(record, dict)] if isinstance(payload, list) else []
+
+
+def field_paths(value: Any, prefix: str = "") -> Iterator[str]:
+    """Dotted paths of every key in a decoded record; list items share the `[]` path segment"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            path = f"{prefix}.{key}" if prefix else str(key)
+            yield path
+            yield from field_paths(item, path)
+    elif isinstance(value, list):
+        for item in value:
+            yield from field_paths(item, f"{prefix}[]")
+
+
+def inspect_payload(schema_reference: str, content: bytes) -> Dict[str, Dict[str, int]]:
+    """Validates every record of a raw payload against the full schema; runs in the parser pool.
+    Returns the records' field paths, missing fields and fields failing validation, with counts"""
+    schema = resolve_schema(schema_reference)
+    findings = {"records": Counter(), "fields": Counter(), "missing": Counter(), "retyped": Counter()}
+    for record in payload_records(json.loads(content)):
+        findings["records"]["total"] += 1
+        findings["fields"].update(set(field_paths(record)))
+        try:
+            schema.model_validate(record)
+        except ValidationError as e:
+            for error in e.errors():
+                field = ".".join(str(part) for part in error["loc"])
+                if error["type"] == "missing":
+                    findings["missing"][field] += 1
+                else:
+                    findings["retyped"][f"{field} ({error['type']})"] += 1
+    return {kind: dict(counts) for kind, counts in findings.items()}
+
+
+class SchemaDriftMonitor:
+    """Decides which responses are strictly validated and collects the findings of a run
+
+    Fields are reported as new against `baseline`, the fields each provider sent in previous
+    refreshes. A provider without a baseline yet has its first one recorded instead
+    """
+
+    def __init__(self, baseline: Optional[Dict[str, Dict[str, db.ProviderField]]] = None):
+        self.baseline = baseline or {}
+        self.first_seen: Set[str] = set()
+        self.responses: Counter = Counter()
+        self.validated: Counter = Counter()
+        self.findings: Dict[str, Dict[str, Counter]] = {}
+        self.pending: Set[asyncio.Task] = set()
+
+    @classmethod
+    def load(cls, engine) -> "SchemaDriftMonitor":
+        baseline: Dict[str, Dict[str, db.ProviderField]] = {}
+        for row in db.get_provider_fields(engine):
+            baseline.setdefault(row.provider, {})[row.field] = row
+        logging.info(f"Loaded payload field baselines for providers: {sorted(baseline)}")
+        return cls(baseline)
+
+    def policy(self, provider: str) -> ValidationPolicy:
+        from sportscanner.crawlers.providers import get_provider  # The registry imports this module
+
+        spec = get_provider(provider)
+        return spec.validation if spec else DEFAULT_VALIDATION_POLICY
+
+    def should_validate(self, provider: str) -> bool:
+        self.responses[provider] += 1
+        policy = self.policy(provider)
+        if policy.schema is None:
+            return False
+        if provider not in self.first_seen:
+            self.first_seen.add(provider)
+            return True
+        sample_rate = (
+            settings.CRAWLER_VALIDATION_SAMPLE_RATE
+            if settings.CRAWLER_VALIDATION_SAMPLE_RATE is not None
+            else policy.sample_rate
+        )
+        return random.random() < sample_rate
+
+    async def inspect(self, provider: str, content: bytes, executor=None):
+        """Strictly validates `content` when sampled; never fails the crawl"""
+        if not self.should_validate(provider):
+            return
+        try:
+            reference = self.policy(provider).schema
+            if executor is None:
+                findings = inspect_payload(reference, content)
+            else:
+                findings = await asyncio.get_running_loop().run_in_executor(
+                    executor, functools.partial(inspect_payload, reference, content)
+                )
+        except Exception as e:
+            logging.warning(f"Strict validation of a {provider} response failed to run: {e!r}")
+            return
+        self.validated[provider] += 1
+        totals = self.findings.setdefault(provider, {kind: Counter() for kind in findings})
+        for kind, counts in findings.items():
+            totals[kind].update(counts)
+
+    def new_fields(self, provider: str) -> Dict[str, int]:
+        """Fields of this run's validated records never seen before; none without a baseline"""
+        known = self.baseline.get(provider)
+        if not known:
+            return {}
+        fields = self.findings[provider]["fields"]
+        return {field: count for field, count in fields.items() if field not in known}
+
+    def schedule(self, provider: str, content: bytes, executor=None):
+        """Runs `inspect` as a background task on the running loop; `drain` awaits them"""
+        task = asyncio.get_running_loop().create_task(self.inspect(provider, content, executor))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def drain(self):
+        """Waits for scheduled validations; call on their loop before it closes"""
+        while self.pending:
+            await asyncio.gather(*self.pending)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """One row per provider and drifted field"""
+        rows = []
+        for provider, findings in self.findings.items():
+            for kind, counts in [
+                ("new", self.new_fields(provider)),
+                ("missing", findings["missing"]),
+                ("retyped", findings["retyped"]),
+            ]:
+                for field, count in counts.items():
+                    rows.append(
+                        {
+                            "provider": provider,
+                            "change": kind,
+                            "field": field,
+                            "records": count,
+                            "records_validated": findings["records"].get("total", 0),
+                        }
+                    )
+        return rows
+
+    def publish(self, artifact_key: str):
+        """Logs the drift report and attaches it to the flow run when anything drifted; call once
+        scheduled validations are drained"""
+        sampled = {provider: f"{self.validated[provider]}/{count}" for provider, count in self.responses.items()}
+        rows = self.report()
+        if not rows:
+            logging.info(f"No schema drift in strictly validated responses: {sampled}")
+            return
+        for row in rows:
+            logging.warning(
+                f"Schema drift in {row['provider']}: {row['change']} field `{row['field']}` "
+                f"in {row['records']}/{row['records_validated']} validated records"
+            )
+        create_table_artifact(
+            key=artifact_key,
+            table=rows,
+            description=f"Fields drifting from the full provider schemas (responses validated: {sampled})",
+        )
+
+    def save(self, engine, now: Optional[datetime] = None):
+        """Adds this run's fields to the providers' baselines, keeping when each was first seen"""
+        now = now or datetime.now()
+        provider_fields = []
+        for provider, findings in self.findings.items():
+            known = self.baseline.get(provider, {})
+            for field in findings["fields"]:
+                previous = known.get(field)
+                provider_fields.append(
+                    db.ProviderField(
+                        provider=provider,
+                        field=field,
+                        first_seen=previous.first_seen if previous is not None else now,
+                        last_seen=now,
+                    )
+                )
+        db.upsert_provider_fields(engine, provider_fields)
+        logging.info(f"Payload field baselines saved: {len(provider_fields)} fields observed")
+
+
+_active_monitor: ContextVar[Optional[SchemaDriftMonitor]] = ContextVar("active_drift_monitor", default=None)
+
+
+def activate(monitor: SchemaDriftMonitor) -> Token:
+    """Samples responses parsed by crawls started from the current context"""
+    return _active_monitor.set(monitor)
+
+
+def active_monitor() -> Optional[SchemaDriftMonitor]:
+    return _active_monitor.get()
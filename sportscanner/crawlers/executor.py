@@ -0,0 +1,89 @@
+"""Runs CPU-bound response parsing off the event loop, so the loop only does I/O
+
+`CRAWLER_PARSER_POOL` selects where parsers run: `process` (default, scales with cores),
+`thread` (frees the loop, still bound by the GIL) or `inline` (on the loop, as before)
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Optional, TypeVar
+
+from loguru import logger as logging
+
+from sportscanner.crawlers.archive import active_archive, provider_of
+from sportscanner.crawlers.drift import active_monitor
+from sportscanner.crawlers.fingerprint import active_fingerprints
+from sportscanner.variables import settings
+
+T = TypeVar("T")
+
+
+class ParseError(Exception):
+    """Raised by parsers for payloads they cannot decode, so the response is not remembered
+    as unchanged and gets parsed again next refresh; plain, so it pickles out of the pool"""
+
+
+class ParserPool(Enum):
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+_executor: Optional[Executor] = None
+
+
+def get_parser_executor() -> Optional[Executor]:
+    """Process-wide pool, created on first use; None when parsing runs inline"""
+    global _executor
+    pool = ParserPool(settings.CRAWLER_PARSER_POOL)
+    if pool == ParserPool.INLINE:
+        return None
+    if _executor is None:
+        if pool == ParserPool.PROCESS:
+            # `spawn` avoids forking a process that holds event loop, db pool and Prefect threads
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.CRAWLER_PARSER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CRAWLER_PARSER_WORKERS, thread_name_prefix="parser"
+            )
+        logging.info(f"Started {pool.value} pool for response parsing")
+    return _executor
+
+
+async def run_parser(parser: Callable[..., T], *args) -> T:
+    """Runs `parser(*args)` in the configured pool; `parser` and its arguments must be picklable
+    for the process pool, i.e. module-level functions taking raw bytes and plain metadata
+
+    Parsers are called as `parser(content, *metadata, source_key)`, which is also how payloads
+    are recorded when a raw payload archive is active, and what a schema drift monitor samples
+    in the background, so crawlers never wait on strict validation
+    """
+    archive = active_archive()
+    if archive is not None:
+        archive.add(parser, args[0], args[1:-1], source_key=args[-1])
+    executor = get_parser_executor()
+    if executor is None:
+        result = parser(*args)
+    else:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, functools.partial(parser, *args))
+    fingerprints = active_fingerprints()
+    if fingerprints is not None:
+        fingerprints.confirm(args[-1])  # Parsed without error, so its fingerprint may be kept
+    monitor = active_monitor()
+    if monitor is not None:
+        monitor.schedule(provider_of(parser), args[0], executor)
+    return result
+
+
+def shutdown_parser_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,151 @@
+"""Content-hash change detection for provider responses, keyed per request"""
+
+import hashlib
+import os
+from contextvars import ContextVar, Token
+from datetime import date, datetime
+from functools import lru_cache
+from glob import glob
+from typing import Dict, List, Optional, Set, Union
+
+import httpx
+from loguru import logger as logging
+
+import sportscanner.storage.postgres.database as db
+
+
+def generate_request_key(provider: str, venue_slug: str, fetch_date: Union[date, str], activity: str) -> str:
+    return "|".join([provider, venue_slug, str(fetch_date), activity])
+
+
+PARSERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parsers")
+
+
+@lru_cache(maxsize=None)
+def parser_version(provider: str) -> str:
+    """Digest of the code turning a provider's payloads into slots: its parser package and the
+    shared schemas. Mixed into response digests, so a code change re-parses every response"""
+    paths = sorted(glob(os.path.join(PARSERS_DIR, provider, "*.py"))) + [os.path.join(PARSERS_DIR, "schema.py")]
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def response_digest(provider: str, content: bytes) -> str:
+    """`<parser version>:<content hash>`, so fingerprints from older parser code never match"""
+    return f"{parser_version(provider)}:{hashlib.blake2b(content, digest_size=16).hexdigest()}"
+
+
+class ResponseFingerprints:
+    """Remembers a digest (and ETag/Last-Modified) per request key between refreshes
+
+    Only active inside a refresh that called `activate`, so on-demand crawls which hand slots
+    straight back to the caller never have responses skipped. A changed response's fingerprint
+    is only kept once it has been parsed without error (`confirm`)
+    """
+
+    def __init__(self, known: Dict[str, db.ResponseFingerprint]):
+        self.known = known
+        self.requested: Set[str] = set()
+        self.pending: Dict[str, db.ResponseFingerprint] = {}
+        self.observed: Dict[str, db.ResponseFingerprint] = {}
+        self.unchanged: Set[str] = set()
+
+    @classmethod
+    def load(cls, engine) -> "ResponseFingerprints":
+        rows: List[db.ResponseFingerprint] = db.get_all_rows(
+            engine, db.ResponseFingerprint, db.select(db.ResponseFingerprint)
+        )
+        logging.info(f"Loaded {len(rows)} response fingerprints from previous refresh")
+        return cls({row.request_key: row for row in rows})
+
+    def previous(self, provider: str, request_key: str) -> Optional[db.ResponseFingerprint]:
+        """Last refresh's fingerprint, unless it was taken with different parser code"""
+        previous = self.known.get(request_key)
+        if previous is not None and previous.digest.startswith(f"{parser_version(provider)}:"):
+            return previous
+        return None
+
+    def conditional_headers(self, provider: str, request_key: str) -> Dict[str, str]:
+        """Validators from the last response, for providers that honour conditional requests"""
+        self.requested.add(request_key)
+        previous = self.previous(provider, request_key)
+        headers = {}
+        if previous is not None and previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous is not None and previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+        return headers
+
+    def is_unchanged(self, provider: str, request_key: str, response: httpx.Response) -> bool:
+        """True if the response matches the one from the last refresh; otherwise its fingerprint
+        waits for `confirm`"""
+        previous = self.previous(provider, request_key)
+        if response.status_code == httpx.codes.NOT_MODIFIED and previous is not None:
+            self.observed[request_key] = db.ResponseFingerprint(
+                request_key=request_key,
+                digest=previous.digest,
+                etag=previous.etag,
+                last_modified=previous.last_modified,
+                last_seen=datetime.now(),
+            )
+            self.unchanged.add(request_key)
+            return True
+        if response.status_code != httpx.codes.OK:
+            return False
+        digest = response_digest(provider, response.content)
+        fingerprint = db.ResponseFingerprint(
+            request_key=request_key,
+            digest=digest,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            last_seen=datetime.now(),
+        )
+        if previous is not None and previous.digest == digest:
+            self.observed[request_key] = fingerprint
+            self.unchanged.add(request_key)
+            return True
+        self.pending[request_key] = fingerprint
+        return False
+
+    def confirm(self, request_key: Optional[str]):
+        """Keeps the fingerprint of a changed response once its payload parsed successfully"""
+        fingerprint = self.pending.pop(request_key, None)
+        if fingerprint is not None:
+            self.observed[request_key] = fingerprint
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "responses": len(self.observed),
+            "unchanged": len(self.unchanged),
+            "changed": len(self.observed) - len(self.unchanged),
+        }
+
+    def save(self, engine):
+        """Persists this refresh's fingerprints; call only once its slots have been stored
+
+        Keys that were requested but got no usable (or parsable) response lose their fingerprint,
+        as their rows are swept and must be re-parsed next time; keys not requested are left alone
+        """
+        db.upsert_response_fingerprints(
+            engine,
+            list(self.observed.values()),
+            stale_request_keys=self.requested - set(self.observed),
+        )
+        logging.info(f"Response fingerprints saved: {self.stats()}")
+
+
+_active_fingerprints: ContextVar[Optional[ResponseFingerprints]] = ContextVar(
+    "active_fingerprints", default=None
+)
+
+
+def activate(fingerprints: ResponseFingerprints) -> Token:
+    """Enables change detection for crawls started from the current context"""
+    return _active_fingerprints.set(fingerprints)
+
+
+def active_fingerprints() -> Optional[ResponseFingerprints]:
+    return _active_fingerprints.get()
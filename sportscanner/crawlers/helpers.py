@@ -1,15 +1,15 @@
 import asyncio
-from typing import Any, List, Tuple, Union
+from typing import Any, AsyncIterator, List, Tuple, Union
 
+from loguru import logger as logging
 from prefect.cache_policies import NO_CACHE
 
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
 from prefect import task
 
-@task(cache_policy=NO_CACHE)
-async def SportscannerCrawlerBot(
-    *coroutine_lists: Union[List[Any], Any]
-) -> List[UnifiedParserSchema]:
+
+def collect_coroutines(*coroutine_lists: Union[List[Any], Any]) -> List[Any]:
+    """Flattens provider coroutines (single or lists of) into one list of coroutines"""
     # Normalize inputs: wrap single coroutines in a list
     normalized_inputs = [
         coro_list if isinstance(coro_list, list) else [coro_list]
@@ -21,9 +21,32 @@ async def SportscannerCrawlerBot(
 
     # Ensure all inputs are valid coroutines
     assert all(asyncio.iscoroutine(c) for c in coroutines), "Invalid coroutine in input"
+    return coroutines
+
+
+@task(cache_policy=NO_CACHE)
+async def SportscannerCrawlerBot(
+    *coroutine_lists: Union[List[Any], Any]
+) -> List[UnifiedParserSchema]:
+    coroutines = collect_coroutines(*coroutine_lists)
 
     if not coroutines:
         return []
 
     # Run only non-empty coroutines with asyncio.gather
     return await asyncio.gather(*coroutines)
+
+
+async def SportscannerCrawlerStream(
+    *coroutine_lists: Union[List[Any], Any]
+) -> AsyncIterator[List[UnifiedParserSchema]]:
+    """Yields each crawler's slots as soon as it finishes, instead of waiting on the slowest one"""
+    coroutines = collect_coroutines(*coroutine_lists)
+    for next_completed in asyncio.as_completed(coroutines):
+        try:
+            slots = await next_completed
+        except Exception as e:
+            logging.error(f"Crawler coroutine failed with error: {e}")
+            continue
+        if slots:
+            yield slots
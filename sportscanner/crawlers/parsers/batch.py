@@ -0,0 +1,199 @@
+"""Columnar container for the slots of a crawl
+
+Tens of thousands of `UnifiedParserSchema` objects each carry their own `__dict__` and copies
+of the same handful of categories, prices, venues and booking urls. `SlotBatch` keeps one typed
+array per field instead: dates, times and counts as integers, and strings (plus refresh
+timestamps) interned once per batch and referenced by index. Parsers fill one batch per response with
+`add`, and crawlers merge those as responses complete, so no per-slot objects are kept
+"""
+
+import asyncio
+from array import array
+from datetime import date, datetime, time
+from typing import Any, Awaitable, Dict, Hashable, Iterable, Iterator, List, Optional, Union
+
+from loguru import logger as logging
+
+from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+
+
+class InternTable:
+    """Distinct values of a column; index 0 is reserved for None"""
+
+    def __init__(self):
+        self.values: List[Any] = [None]
+        self._index: Dict[Hashable, int] = {}
+
+    def intern(self, value) -> int:
+        if value is None:
+            return 0
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def seconds_of_day(value: time) -> int:
+    """Sub-second precision is dropped; providers only publish whole minutes"""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def time_of_day(seconds: int) -> time:
+    return time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class SlotBatch:
+    """Append-only columnar set of slots; iterating it yields `UnifiedParserSchema` rows"""
+
+    def __init__(self):
+        self.strings = InternTable()  # category, price, composite_key, booking_url, source_key
+        self.timestamps = InternTable()  # last_refreshed, one per parsed response
+        self.dates = array("I")  # Proleptic Gregorian ordinals
+        self.starting_times = array("I")  # Seconds since midnight
+        self.ending_times = array("I")
+        self.spaces = array("i")
+        self.price_pences = array("i")  # -1 when there is no price
+        self.last_refreshed = array("I")
+        self.categories = array("I")
+        self.prices = array("I")
+        self.composite_keys = array("I")
+        self.booking_urls = array("I")
+        self.source_keys = array("I")
+
+    @classmethod
+    def of(cls, slots: Union["SlotBatch", Iterable[UnifiedParserSchema]]) -> "SlotBatch":
+        if isinstance(slots, SlotBatch):
+            return slots
+        batch = cls()
+        batch.extend(slots)
+        return batch
+
+    @classmethod
+    def from_responses(
+        cls, responses: Iterable[Union["SlotBatch", Iterable[UnifiedParserSchema]]]
+    ) -> "SlotBatch":
+        """Flattens per-request slot lists (or per-provider batches) into one batch"""
+        batch = cls()
+        for slots in responses:
+            batch.extend(slots)
+        return batch
+
+    def add(
+        self,
+        category: str,
+        starting_time: time,
+        ending_time: time,
+        date: date,
+        price: str,
+        price_pence: Optional[int],
+        spaces: int,
+        composite_key: str,
+        last_refreshed: datetime,
+        booking_url: Optional[str],
+        source_key: Optional[str] = None,
+    ):
+        """Appends one slot from its field values, e.g. `UnifiedParserSchema.*_fields`"""
+        self.dates.append(date.toordinal())
+        self.starting_times.append(seconds_of_day(starting_time))
+        self.ending_times.append(seconds_of_day(ending_time))
+        self.spaces.append(spaces)
+        self.price_pences.append(-1 if price_pence is None else price_pence)
+        self.last_refreshed.append(self.timestamps.intern(last_refreshed))
+        self.categories.append(self.strings.intern(category))
+        self.prices.append(self.strings.intern(price))
+        self.composite_keys.append(self.strings.intern(composite_key))
+        self.booking_urls.append(self.strings.intern(booking_url))
+        self.source_keys.append(self.strings.intern(source_key))
+
+    def append(self, slot: UnifiedParserSchema):
+        self.add(
+            category=slot.category,
+            starting_time=slot.starting_time,
+            ending_time=slot.ending_time,
+            date=slot.date,
+            price=slot.price,
+            price_pence=slot.price_pence,
+            spaces=slot.spaces,
+            composite_key=slot.composite_key,
+            last_refreshed=slot.last_refreshed,
+            booking_url=slot.booking_url,
+            source_key=slot.source_key,
+        )
+
+    def extend(self, slots: Union["SlotBatch", Iterable[UnifiedParserSchema]]):
+        if isinstance(slots, SlotBatch):
+            self.extend_batch(slots)
+            return
+        for slot in slots:
+            self.append(slot)
+
+    def extend_batch(self, other: "SlotBatch"):
+        """Appends another batch column by column, re-interning only its distinct values"""
+        strings = array("I", [self.strings.intern(value) for value in other.strings.values])
+        timestamps = array("I", [self.timestamps.intern(value) for value in other.timestamps.values])
+        self.dates.extend(other.dates)
+        self.starting_times.extend(other.starting_times)
+        self.ending_times.extend(other.ending_times)
+        self.spaces.extend(other.spaces)
+        self.price_pences.extend(other.price_pences)
+        self.last_refreshed.extend(timestamps[index] for index in other.last_refreshed)
+        for column, other_column in [
+            (self.categories, other.categories),
+            (self.prices, other.prices),
+            (self.composite_keys, other.composite_keys),
+            (self.booking_urls, other.booking_urls),
+            (self.source_keys, other.source_keys),
+        ]:
+            column.extend(strings[index] for index in other_column)
+
+    def restamp(self, refreshed_at: datetime) -> "SlotBatch":
+        """Sets every slot's `last_refreshed` to `refreshed_at`"""
+        self.timestamps = InternTable()
+        self.last_refreshed = array("I", [self.timestamps.intern(refreshed_at)]) * len(self)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Plain column values of the i-th slot, as the storage layer inserts them"""
+        strings = self.strings.values
+        return {
+            "category": strings[self.categories[i]],
+            "starting_time": time_of_day(self.starting_times[i]),
+            "ending_time": time_of_day(self.ending_times[i]),
+            "date": date.fromordinal(self.dates[i]),
+            "price": strings[self.prices[i]],
+            "price_pence": None if self.price_pences[i] < 0 else self.price_pences[i],
+            "spaces": self.spaces[i],
+            "composite_key": strings[self.composite_keys[i]],
+            "last_refreshed": self.timestamps.values[self.last_refreshed[i]],
+            "booking_url": strings[self.booking_urls[i]],
+            "source_key": strings[self.source_keys[i]],
+        }
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        for i in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield self.row(i)
+
+    def __iter__(self) -> Iterator[UnifiedParserSchema]:
+        for row in self.rows():
+            yield UnifiedParserSchema.model_construct(**row)
+
+    def distinct_source_keys(self, start: int = 0, stop: Optional[int] = None) -> set:
+        """Source keys of the slots in [start, stop), None excluded"""
+        strings = self.strings.values
+        return {strings[index] for index in set(self.source_keys[start:stop]) if index}
+
+
+async def merge_as_completed(tasks: List[Awaitable["SlotBatch"]]) -> SlotBatch:
+    """Merges each response's batch into one as soon as it arrives, so only the merged columns
+    outlive their response; failed tasks are logged and skipped"""
+    merged = SlotBatch()
+    for task in asyncio.as_completed(tasks):
+        try:
+            merged.extend(await task)
+        except Exception as e:
+            logging.error(f"Request task failed with error: {e!r}")
+    return merged
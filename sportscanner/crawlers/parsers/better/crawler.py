@@ -1,6 +1,7 @@
 import asyncio
 import itertools
-from datetime import date, timedelta
+import json
+from datetime import date, datetime, timedelta
 from typing import Any, Coroutine, Dict, List, Tuple
 
 import httpx
@@ -12,15 +13,18 @@ from sqlalchemy import True_
 from sqlmodel import col, select
 
 import sportscanner.storage.postgres.database as db
-from sportscanner.crawlers.anonymize.proxies import httpxAsyncClient
-from sportscanner.crawlers.parsers.better.helper import (
-    filter_search_dates_for_allowable,
-)
+from sportscanner.crawlers.anonymize.proxies import httpxPooledClient
+from sportscanner.crawlers.executor import ParseError, run_parser
+from sportscanner.crawlers.fingerprint import generate_request_key
+from sportscanner.crawlers.parsers.better.discovery import BETTER_ACTIVITIES, active_discovery
 from sportscanner.crawlers.parsers.better.schema import BetterApiResponseSchema
+from sportscanner.crawlers.parsers.batch import SlotBatch, merge_as_completed
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+from sportscanner.crawlers.tracking import tracked_request
+from sportscanner.crawlers.transport import send_request_if_changed
 from sportscanner.crawlers.parsers.utils import (
     formatted_date_list,
-    validate_api_response,
+    is_json_response,
 )
 from sportscanner.utils import async_timer, timeit
 from prefect import flow, task, get_run_logger, runtime
@@ -29,36 +33,35 @@ from prefect.artifacts import create_markdown_artifact
 @async_timer
 async def send_concurrent_requests(
     parameter_sets: List[Tuple[db.SportsVenue, date]]
-) -> Tuple[List[UnifiedParserSchema], ...]:
+) -> SlotBatch:
     """Core logic to generate Async tasks and collect responses"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    async with httpxAsyncClient() as client:
-        for sports_centre, fetch_date in parameter_sets:
-            async_tasks = create_async_tasks(client, sports_centre, fetch_date)
-            tasks.extend(async_tasks)
-        logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-        # Filter out exceptions
-        successful_responses = []
-        for idx, response in enumerate(responses):
-            if isinstance(response, Exception):
-                logging.error(f"Task {idx} failed with error: {response}")
-            else:
-                successful_responses.append(response)
-        # Flatten successful responses (removes nested list layers)
-        flattened_responses = list(itertools.chain.from_iterable(successful_responses))
-    return flattened_responses
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    client = httpxPooledClient("https://better-admin.org.uk")
+    for sports_centre, fetch_date in parameter_sets:
+        async_tasks = create_async_tasks(client, sports_centre, fetch_date)
+        tasks.extend(async_tasks)
+    logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
+    # Each response's slots are merged into one columnar batch as soon as it is parsed
+    return await merge_as_completed(tasks)
 
 def create_async_tasks(
     client, sports_centre: db.SportsVenue, fetch_date: date
-) -> List[Coroutine[Any, Any, List[UnifiedParserSchema]]]:
+) -> List[Coroutine[Any, Any, SlotBatch]]:
     """Generates Async task for concurrent calls to be made later"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    for activity_duration in ["badminton-40min", "badminton-60min"]:
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    discovery = active_discovery()
+    activities = discovery.activities_for(sports_centre.slug) if discovery else BETTER_ACTIVITIES
+    for activity_duration in activities:
         url, headers, _ = generate_api_call_params(
             sports_centre, fetch_date, activity=activity_duration
         )
-        tasks.append(fetch_data(client, url, headers, metadata=sports_centre))
+        source_key = generate_request_key("better", sports_centre.slug, fetch_date, activity_duration)
+        tasks.append(
+            fetch_data(
+                client, url, headers, metadata=sports_centre, source_key=source_key,
+                activity=activity_duration, fetch_date=fetch_date,
+            )
+        )
     return tasks
 
 
@@ -81,12 +84,12 @@ def generate_api_call_params(
 
 
 @async_timer
-@task(cache_policy=NO_CACHE, retries=2, name="Better API", persist_result=True, retry_delay_seconds=2)
+@tracked_request("better", name="Better API")
 async def fetch_data(
-    client, url: str, headers: Dict, metadata: db.SportsVenue
-) -> List[UnifiedParserSchema]:
+    client, url: str, headers: Dict, metadata: db.SportsVenue, source_key: str,
+    activity: str, fetch_date: date,
+) -> SlotBatch:
     """Initiates request to server asynchronous using httpx"""
-    logging = get_run_logger()
     # task_run_id = runtime.task_run.id  # Get the current task run ID
     # await create_markdown_artifact(
     #     key=f"better-crawler-x{task_run_id[:3]}",
@@ -94,19 +97,39 @@ async def fetch_data(
     #     description="Task inputs for fetch_data"
     # )
     logging.debug(f"Fetching data from {url} with headers {headers} and metadata {metadata}")
-    response = await client.get(url, headers=headers)
+    response = await send_request_if_changed("better", client, url, headers, source_key)
+    if response is None:
+        return SlotBatch()
+    discovery = active_discovery()
+    if response.status_code == 404:
+        logging.debug(f"{metadata.slug} does not serve {activity}: {url}")
+        if discovery:
+            discovery.observe(metadata.slug, activity, fetch_date, slots=None)
+        return SlotBatch()
     response.raise_for_status()  # Ensure non-200 responses are treated as exceptions
     content_type = response.headers.get("content-type", "")
-    validated_response = validate_api_response(response, content_type, url)
-    validated_response_data = validated_response.get("data")
+    if not is_json_response(response, content_type, url):
+        return SlotBatch()
+    slots = await run_parser(parse_response, response.content, metadata, source_key)
+    if discovery:
+        discovery.observe(metadata.slug, activity, fetch_date, slots=len(slots))
+    return slots
+
+
+def parse_response(
+    content: bytes, metadata: db.SportsVenue, source_key: str
+) -> SlotBatch:
+    """Decodes, validates and standardises a raw response; runs in the parser pool"""
+    validated_response_data = json.loads(content).get("data")
     if validated_response_data is not None:
         raw_responses_with_schema = apply_raw_response_schema(validated_response_data)
-        return [
-            UnifiedParserSchema.from_better_api_response(response, metadata)
-            for response in raw_responses_with_schema
-        ]
+        refreshed_at = datetime.now()
+        slots = SlotBatch()
+        for response in raw_responses_with_schema:
+            slots.add(**UnifiedParserSchema.better_api_response_fields(response, metadata, source_key, refreshed_at))
+        return slots
     else:
-        return []
+        return SlotBatch()
 
 
 def apply_raw_response_schema(api_response) -> List[BetterApiResponseSchema]:
@@ -124,6 +147,7 @@ def apply_raw_response_schema(api_response) -> List[BetterApiResponseSchema]:
                 f"Unable to apply Better API response schema to raw API json:\n{e}"
             )
             logging.error(f"{api_response}")
+            raise ParseError(str(e)) from None
     else:
         if len(api_response) > 0:
             try:
@@ -137,6 +161,7 @@ def apply_raw_response_schema(api_response) -> List[BetterApiResponseSchema]:
                 logging.error(
                     f"Unable to apply BetterApiResponseSchema to raw API json:\n{e}"
                 )
+                raise ParseError(str(e)) from None
     logging.debug(f"Data aligned with overall schema: {BetterApiResponseSchema}")
     return aligned_api_response
 
@@ -159,10 +184,7 @@ def get_concurrent_requests(
 def pipeline(
     search_dates: List[date], composite_identifiers: List[str]
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
-    allowable_search_dates = filter_search_dates_for_allowable(search_dates)
-    logging.warning(
-        f"Search dates for Better.Org crawler narrowed down to: {formatted_date_list(allowable_search_dates)}"
-    )
+    """`search_dates` are expected within Better's booking horizon, see `crawlers.providers`"""
     sports_centre_lists: List[db.SportsVenue] = db.get_all_rows(
         db.engine,
         table=db.SportsVenue,
@@ -174,7 +196,7 @@ def pipeline(
         f"{len(sports_centre_lists)} Sports venue data queried from database"
     )
 
-    return get_concurrent_requests(sports_centre_lists, allowable_search_dates)
+    return get_concurrent_requests(sports_centre_lists, search_dates)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+"""Remembers which activity slugs each Better venue serves, so the fan-out skips the others"""
+
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger as logging
+
+import sportscanner.storage.postgres.database as db
+from sportscanner.variables import settings
+
+ORGANISATION_WEBSITE = "https://www.better.org.uk"
+BETTER_ACTIVITIES: List[str] = ["badminton-40min", "badminton-60min"]
+
+# Dates that must all come back empty before an activity counts as not served, so a quiet
+# day (or tonight's empty remainder of today) does not hide an activity for a whole TTL
+MIN_EMPTY_DATES = 3
+
+
+@dataclass
+class Observation:
+    served: bool = False
+    not_found: bool = False
+    empty_dates: Set[date] = field(default_factory=set)
+
+
+class ActivityDiscovery:
+    """Per-venue activity cache with a TTL
+
+    Activities without a fresh entry are requested (probed) like before; what comes back
+    decides whether they are requested next time. Only active inside a refresh that called
+    `activate`, so on-demand crawls always request every activity
+    """
+
+    def __init__(self, known: Dict[Tuple[str, str], db.VenueActivity], ttl: timedelta):
+        self.known = known
+        self.ttl = ttl
+        self.observed: Dict[Tuple[str, str], Observation] = {}
+        self.skipped: int = 0
+
+    @classmethod
+    def load(cls, engine) -> "ActivityDiscovery":
+        rows = db.get_venue_activities(engine, ORGANISATION_WEBSITE)
+        logging.info(f"Loaded {len(rows)} discovered Better venue activities")
+        return cls(
+            {(row.venue_slug, row.activity): row for row in rows},
+            ttl=timedelta(hours=settings.BETTER_ACTIVITY_DISCOVERY_TTL),
+        )
+
+    def activities_for(self, venue_slug: str, now: Optional[datetime] = None) -> List[str]:
+        """Activities known to be served, plus those never or no longer recently checked"""
+        now = now or datetime.now()
+        activities = []
+        for activity in BETTER_ACTIVITIES:
+            entry = self.known.get((venue_slug, activity))
+            if entry is not None and not entry.served and now - entry.checked_at < self.ttl:
+                self.skipped += 1
+                continue
+            activities.append(activity)
+        return activities
+
+    def observe(self, venue_slug: str, activity: str, fetch_date: date, slots: Optional[int]):
+        """`slots` is the number of slots parsed, or None when the venue has no such activity"""
+        observation = self.observed.setdefault((venue_slug, activity), Observation())
+        if slots is None:
+            observation.not_found = True
+        elif slots > 0:
+            observation.served = True
+        else:
+            observation.empty_dates.add(fetch_date)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "observed": len(self.observed),
+            "served": sum(o.served for o in self.observed.values()),
+            "skipped_requests": self.skipped,
+        }
+
+    def save(self, engine, now: Optional[datetime] = None):
+        """Persists conclusive observations; inconclusive ones leave the previous entry alone"""
+        now = now or datetime.now()
+        venue_activities = []
+        for (venue_slug, activity), observation in self.observed.items():
+            if observation.served:
+                served = True
+            elif observation.not_found or len(observation.empty_dates) >= MIN_EMPTY_DATES:
+                served = False
+            else:
+                continue
+            venue_activities.append(
+                db.VenueActivity(
+                    organisation_website=ORGANISATION_WEBSITE,
+                    venue_slug=venue_slug,
+                    activity=activity,
+                    served=served,
+                    checked_at=now,
+                )
+            )
+        db.upsert_venue_activities(engine, venue_activities)
+        logging.info(f"Better activity discovery saved: {self.stats()}")
+
+
+_active_discovery: ContextVar[Optional[ActivityDiscovery]] = ContextVar("active_discovery", default=None)
+
+
+def activate(discovery: ActivityDiscovery) -> Token:
+    """Enables activity discovery for crawls started from the current context"""
+    return _active_discovery.set(discovery)
+
+
+def active_discovery() -> Optional[ActivityDiscovery]:
+    return _active_discovery.get()
@@ -1,6 +1,7 @@
 import asyncio
-import itertools
-from datetime import date, timedelta
+import json
+from collections import Counter
+from datetime import date, datetime, timedelta
 from typing import Any, Coroutine, Dict, List, Tuple
 
 import httpx
@@ -10,43 +11,54 @@ from pydantic import ValidationError
 from sqlmodel import col, select
 
 import sportscanner.storage.postgres.database as db
-from sportscanner.crawlers.anonymize.proxies import httpxAsyncClient
-from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema
+from sportscanner.crawlers.anonymize.proxies import httpxPooledClient
+from sportscanner.crawlers.executor import ParseError, run_parser
+from sportscanner.crawlers.fingerprint import generate_request_key
+from sportscanner.crawlers.parsers.citysports.mappings import SiteRoute, route_venues, siteRoutes
+from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema, CitySportsSlotSchema
+from sportscanner.crawlers.parsers.batch import SlotBatch, merge_as_completed
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+from sportscanner.crawlers.tracking import tracked_request
+from sportscanner.crawlers.transport import send_request_if_changed
 from sportscanner.utils import async_timer, timeit
+from sportscanner.variables import settings
 from prefect import flow, task
 
+ACTIVITY_GROUP = "Badminton"
+
 @async_timer
 async def send_concurrent_requests(
-    parameter_sets: List[Tuple[db.SportsVenue, date]]
-) -> Tuple[List[UnifiedParserSchema], ...]:
+    sports_centre_lists: List[db.SportsVenue], search_dates: List[date]
+) -> SlotBatch:
     """Core logic to generate Async tasks and collect responses"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    async with httpxAsyncClient() as client:
-        for sports_centre, fetch_date in parameter_sets:
-            async_tasks = create_async_tasks(client, sports_centre, fetch_date)
-            tasks.extend(async_tasks)
-        logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-        # Filter out exceptions
-        successful_responses = []
-        for idx, response in enumerate(responses):
-            if isinstance(response, Exception):
-                logging.error(f"Task {idx} failed with error: {response}")
-            else:
-                successful_responses.append(response)
-        # Flatten successful responses (removes nested list layers)
-        flattened_responses = list(itertools.chain.from_iterable(successful_responses))
-    return flattened_responses
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    client = httpxPooledClient("https://bookings.citysport.org.uk")
+    routes = route_venues(sports_centre_lists)
+    if not routes:
+        logging.warning("No site routes for the requested CitySports venues")
+        return SlotBatch()
+    for fetch_date in search_dates:
+        async_tasks = create_async_tasks(client, routes, fetch_date)
+        tasks.extend(async_tasks)
+    logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
+    # Each response's slots are merged into one columnar batch as soon as it is parsed
+    return await merge_as_completed(tasks)
 
 
 def create_async_tasks(
-    client, sports_centre: db.SportsVenue, search_date: date
-) -> List[Coroutine[Any, Any, List[UnifiedParserSchema]]]:
-    """Generates Async task for concurrent calls to be made later"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
+    client, routes: Dict[int, List[Tuple[SiteRoute, db.SportsVenue]]], search_date: date
+) -> List[Coroutine[Any, Any, SlotBatch]]:
+    """Generates Async task for concurrent calls to be made later
+
+    A day's timetable lists every venue, so it is fetched once and its activities are routed
+    to venues by `SiteId`/`LocationCode`
+    """
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
     url, headers, _ = generate_api_call_params(search_date)
-    tasks.append(fetch_data(client, url, headers, metadata=sports_centre))
+    # The routed venues are part of the key, so adding a venue never reuses an older response
+    routed_slugs = "+".join(sorted(venue.slug for site in routes.values() for _, venue in site))
+    source_key = generate_request_key("citysports", routed_slugs, search_date, "all")
+    tasks.append(fetch_data(client, url, headers, metadata=routes, source_key=source_key))
     return tasks
 
 
@@ -65,35 +77,83 @@ def generate_api_call_params(search_date: date):
     payload: Dict = {}
     return url, headers, payload
 
-@task(cache_policy=NO_CACHE, retries=2, name="CitySports API", persist_result=True, retry_delay_seconds=2)
 @async_timer
+@tracked_request("citysports", name="CitySports API")
 async def fetch_data(
-    client, url, headers, metadata: db.SportsVenue
-) -> List[UnifiedParserSchema]:
+    client, url, headers, metadata: Dict[int, List[Tuple[SiteRoute, db.SportsVenue]]], source_key: str
+) -> SlotBatch:
     """Initiates request to server asynchronous using httpx"""
-    response = await client.get(url, headers=headers)
-    content_type = response.headers.get("content-type", "")
+    response = await send_request_if_changed("citysports", client, url, headers, source_key)
+    if response is None:
+        return SlotBatch()
     match response.status_code:
         case 200:
-            json_response = response.json()
-            logging.debug(
-                f"Request success: Raw response for url: {url} \n{json_response}"
-            )
+            logging.debug(f"Request success: Raw response for url: {url}")
         case _:
             logging.error(
                 f"Response status code is not: Response [200 OK]"
                 f"\nResponse: {response}"
             )
+            return SlotBatch()
+    return await run_parser(parse_response, response.content, metadata, source_key)
+
+
+def parse_response(
+    content: bytes, metadata: Dict[int, List[Tuple[SiteRoute, db.SportsVenue]]], source_key: str
+) -> SlotBatch:
+    """Decodes, validates and standardises a raw response; runs in the parser pool"""
+    json_response = json.loads(content)
+    if len(json_response) > 0:
+        warn_unrouted_sites(json_response)
+        if settings.CRAWLER_STRICT_DECODING:
+            raw_responses_with_schema = apply_raw_response_schema(json_response)
+        else:
+            raw_responses_with_schema = decode_slot_activities(json_response, set(metadata))
+        refreshed_at = datetime.now()
+        slots = SlotBatch()
+        for response in raw_responses_with_schema:
+            if response.ActivityGroupDescription != ACTIVITY_GROUP:
+                continue
+            for route, venue in metadata.get(response.SiteId, []):
+                if route.locationCodes is None or response.LocationCode in route.locationCodes:
+                    slots.add(
+                        **UnifiedParserSchema.citysports_api_response_fields(response, venue, source_key, refreshed_at)
+                    )
+        return slots
+    else:
+        return SlotBatch()
+
+
+def warn_unrouted_sites(api_response: list):
+    """Badminton activities under a `SiteId` missing from `siteRoutes` belong to no venue and
+    are dropped; they are counted per SiteId so new CitySports sites get noticed"""
+    routed_site_ids = {route.siteId for route in siteRoutes}
+    unrouted = Counter(
+        response_block.get("SiteId")
+        for response_block in api_response
+        if response_block.get("ActivityGroupDescription") == ACTIVITY_GROUP
+        and response_block.get("SiteId") not in routed_site_ids
+    )
+    if unrouted:
+        logging.warning(
+            f"Dropping {sum(unrouted.values())} {ACTIVITY_GROUP} activities of SiteIds missing from "
+            f"siteRoutes (SiteId: count): {dict(unrouted)}"
+        )
+
 
-    if len(response.json()) > 0:
-        raw_responses_with_schema = apply_raw_response_schema(response.json())
+def decode_slot_activities(api_response: list, site_ids: set) -> List[CitySportsSlotSchema]:
+    """Keeps badminton activities of requested sites on the raw json, then validates only the
+    fields a slot is built from; the rest of the day's timetable is never validated"""
+    try:
         return [
-            UnifiedParserSchema.from_citysports_api_response(response, metadata)
-            for response in raw_responses_with_schema
-            if response.ActivityGroupDescription == "Badminton"
+            CitySportsSlotSchema(**response_block)
+            for response_block in api_response
+            if response_block.get("ActivityGroupDescription") == ACTIVITY_GROUP
+            and response_block.get("SiteId") in site_ids
         ]
-    else:
-        return []
+    except ValidationError as e:
+        logging.error(f"Unable to apply CitySportsSlotSchema to raw API json:\n{e}")
+        raise ParseError(str(e)) from None
 
 
 def apply_raw_response_schema(api_response) -> List[CitySportsResponseSchema]:
@@ -106,7 +166,7 @@ def apply_raw_response_schema(api_response) -> List[CitySportsResponseSchema]:
         return aligned_api_response
     except ValidationError as e:
         logging.error(f"Unable to apply CitySportsResponseSchema to raw API json:\n{e}")
-        raise ValidationError
+        raise ParseError(str(e)) from None
 
 @timeit
 def get_concurrent_requests(
@@ -114,13 +174,10 @@ def get_concurrent_requests(
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
     """Runs the Async API calls, collects and standardises responses and populate distance/postal
     metadata"""
-    parameter_sets: List[Tuple[db.SportsVenue, date]] = [
-        (x, y) for x, y in itertools.product(sports_centre_lists, search_dates)
-    ]
     logging.debug(
         f"VENUES: {[sports_centre.venue_name for sports_centre in sports_centre_lists]}"
     )
-    return send_concurrent_requests(parameter_sets)
+    return send_concurrent_requests(sports_centre_lists, search_dates)
 
 
 @task(name="CitySports Coroutines")
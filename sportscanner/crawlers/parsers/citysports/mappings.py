@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from rich import print
+
+from sportscanner.storage.postgres.database import SportsVenue
+
+
+@dataclass(frozen=True)
+class SiteRoute:
+    """Which activities of a day's timetable belong to a venue"""
+    slug: str
+    siteId: int
+    locationCodes: Optional[FrozenSet[str]] = None  # None: every location at the site
+
+
+siteRoutes: List[SiteRoute] = [
+    SiteRoute(slug="citysport", siteId=1),
+]
+
+
+def route_venues(venues: List[SportsVenue]) -> Dict[int, List[Tuple[SiteRoute, SportsVenue]]]:
+    """Groups the requested venues by the `SiteId` their activities are listed under"""
+    venues_by_slug = {venue.slug: venue for venue in venues}
+    routes: Dict[int, List[Tuple[SiteRoute, SportsVenue]]] = {}
+    for route in siteRoutes:
+        if route.slug in venues_by_slug:
+            routes.setdefault(route.siteId, []).append((route, venues_by_slug[route.slug]))
+    return routes
+
+
+if __name__ == "__main__":
+    print(siteRoutes)
@@ -54,3 +54,16 @@ class CitySportsResponseSchema(BaseModel):
     UntilEndWarningEnabled: bool
     UntilEndWarningText: Optional[str]
     Instructor: Optional[str]
+
+
+class CitySportsSlotSchema(BaseModel):
+    """The fields of a timetable activity that make up a slot; decoded instead of the full
+    `CitySportsResponseSchema` unless `CRAWLER_STRICT_DECODING` is set"""
+
+    SiteId: int
+    LocationCode: str
+    ActivityGroupDescription: str
+    StartTime: str
+    EndTime: str
+    AvailablePlaces: int
+    Price: float
@@ -9,9 +9,10 @@ from rich import print
 from sqlmodel import col, select
 
 import sportscanner.storage.postgres.database as db
-from sportscanner.crawlers.anonymize.proxies import httpxAsyncClient
+from sportscanner.crawlers.anonymize.proxies import httpxPooledClient
 from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+from sportscanner.crawlers.transport import send_request
 from sportscanner.utils import async_timer, timeit
 from prefect import task
 
@@ -21,12 +22,12 @@ async def send_concurrent_requests(
 ) -> Tuple[List[UnifiedParserSchema], ...]:
     """Core logic to generate Async tasks and collect responses"""
     tasks = []
-    async with httpxAsyncClient() as client:
-        for search_date in search_dates:
-            async_tasks = create_async_tasks(client, search_date)
-            tasks.extend(async_tasks)
-        logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
-        responses = await asyncio.gather(*tasks)
+    client = httpxPooledClient("https://ipinfo.io")
+    for search_date in search_dates:
+        async_tasks = create_async_tasks(client, search_date)
+        tasks.extend(async_tasks)
+    logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
+    responses = await asyncio.gather(*tasks)
     return responses
 
 
@@ -55,7 +56,7 @@ def generate_api_call_params(search_date: date):
 @async_timer
 async def fetch_data(client, url, headers) -> List[UnifiedParserSchema]:
     """Initiates request to server asynchronous using httpx"""
-    response = await client.get(url, headers=headers)
+    response = await send_request("playground", client, url, headers)
     content_type = response.headers.get("content-type", "")
     match response.status_code:
         case 200:
@@ -1,12 +1,15 @@
 """Contains dataclasses for the API call schema"""
 
+import re
 from datetime import date, datetime, time, timedelta
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
 
 from pydantic import BaseModel
 
 from sportscanner.crawlers.parsers.better.schema import BetterApiResponseSchema
-from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema
+from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema, CitySportsSlotSchema
+from sportscanner.crawlers.parsers.schoolhire.schema import SchoolHireWeekViewSlot
 from sportscanner.crawlers.parsers.towerhamlets.schema import AggregatedTowerHamletsResponse
 from sportscanner.crawlers.parsers.towerhamlets.mappings import Parameters
 
@@ -21,75 +24,169 @@ class SportsVenue(BaseModel):
     longitude: float
 
 
+# A response repeats the same few dates and clock times across its slots, so each distinct
+# string is parsed once per process
+@lru_cache(maxsize=4096)
+def parse_clock_time(value: str) -> time:
+    """`HH:MM` to time"""
+    return datetime.strptime(value, "%H:%M").time()
+
+
+@lru_cache(maxsize=4096)
+def parse_iso_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+@lru_cache(maxsize=4096)
+def parse_iso_datetime(value: str) -> datetime:
+    """`YYYY-MM-DDTHH:MM:SS` to datetime"""
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+
+
+PRICE_AMOUNT = re.compile(r"(\d+(?:,\d{3})*)(?:\.(\d{1,2}))?")
+
+
+@lru_cache(maxsize=1024)
+def parse_price_pence(value: str) -> Optional[int]:
+    """Display price (e.g. `£12.80`, `£12.8`, `£7`) to integer pence; None when there is no amount"""
+    match = PRICE_AMOUNT.search(value or "")
+    if match is None:
+        return None
+    pounds, pence = match.group(1).replace(",", ""), (match.group(2) or "0").ljust(2, "0")
+    return int(pounds) * 100 + int(pence)
+
+
 class UnifiedParserSchema(BaseModel):
+    """Standardised slot across providers
+
+    The `*_fields` builders trust their input, which was already validated by the provider
+    schema; parsers add their field values straight to a `SlotBatch`, and the `from_*`
+    constructors build instances from them with `model_construct`. Parsers pass one
+    `refreshed_at` for all slots of a response instead of reading the clock per slot
+    """
+
     category: str
     starting_time: time
     ending_time: time
     date: date
     price: str
+    price_pence: Optional[int] = None
     spaces: int
     composite_key: str
     last_refreshed: datetime
     booking_url: Optional[str]
+    source_key: Optional[str] = None
 
     @classmethod
-    def from_better_api_response(
-        cls, response: BetterApiResponseSchema, metadata: SportsVenue
-    ):
-        return cls(
+    def better_api_response_fields(
+        cls,
+        response: BetterApiResponseSchema,
+        metadata: SportsVenue,
+        source_key: Optional[str] = None,
+        refreshed_at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        slot_date = parse_iso_date(response.date)
+        return dict(
             category=response.name,
-            starting_time=datetime.strptime(
-                response.starts_at.format_24_hour, "%H:%M"
-            ).time(),
-            ending_time=datetime.strptime(
-                response.ends_at.format_24_hour, "%H:%M"
-            ).time(),
-            date=datetime.strptime(response.date, "%Y-%m-%d").date(),
+            starting_time=parse_clock_time(response.starts_at.format_24_hour),
+            ending_time=parse_clock_time(response.ends_at.format_24_hour),
+            date=slot_date,
             price=response.price.formatted_amount,
+            price_pence=parse_price_pence(response.price.formatted_amount),
             spaces=response.spaces,
             composite_key=metadata.composite_key,
-            last_refreshed=datetime.now(),
+            last_refreshed=refreshed_at or datetime.now(),
             booking_url="https://bookings.better.org.uk/location/{}/{}/{}/by-time/".format(
                 response.venue_slug,
                 response.category_slug,
-                datetime.strptime(response.date, "%Y-%m-%d").date(),
+                slot_date,
             ),
+            source_key=source_key,
         )
 
     @classmethod
-    def from_citysports_api_response(
-        cls, response: CitySportsResponseSchema, metadata: SportsVenue
-    ):
-        return cls(
+    def from_better_api_response(cls, *args, **kwargs) -> "UnifiedParserSchema":
+        return cls.model_construct(**cls.better_api_response_fields(*args, **kwargs))
+
+    @classmethod
+    def citysports_api_response_fields(
+        cls,
+        response: Union[CitySportsResponseSchema, CitySportsSlotSchema],
+        metadata: SportsVenue,
+        source_key: Optional[str] = None,
+        refreshed_at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        starts_at = parse_iso_datetime(response.StartTime)
+        return dict(
             category=response.ActivityGroupDescription,
-            starting_time=datetime.strptime(
-                response.StartTime, "%Y-%m-%dT%H:%M:%S"
-            ).time(),
-            ending_time=datetime.strptime(response.EndTime, "%Y-%m-%dT%H:%M:%S").time(),
-            date=datetime.strptime(response.StartTime, "%Y-%m-%dT%H:%M:%S").date(),
+            starting_time=starts_at.time(),
+            ending_time=parse_iso_datetime(response.EndTime).time(),
+            date=starts_at.date(),
             price="£" + str(response.Price),
+            price_pence=round(response.Price * 100),
             spaces=response.AvailablePlaces,
             composite_key=metadata.composite_key,
-            last_refreshed=datetime.now(),
+            last_refreshed=refreshed_at or datetime.now(),
             booking_url="https://bookings.citysport.org.uk/LhWeb/en/Public/Bookings/",
+            source_key=source_key,
         )
 
     @classmethod
-    def from_towerhamlets_rolledup_response(
-            cls, response: AggregatedTowerHamletsResponse, metadata: Parameters
-    ):
+    def from_citysports_api_response(cls, *args, **kwargs) -> "UnifiedParserSchema":
+        return cls.model_construct(**cls.citysports_api_response_fields(*args, **kwargs))
+
+    @classmethod
+    def schoolhire_week_view_slot_fields(
+        cls,
+        response: SchoolHireWeekViewSlot,
+        metadata: SportsVenue,
+        source_key: Optional[str] = None,
+        refreshed_at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        return dict(
+            category="Badminton",
+            starting_time=response.starting_time,
+            ending_time=response.ending_time,
+            date=response.date,
+            price="N/A",  # The week view does not show prices
+            price_pence=None,
+            spaces=1,  # Each listed slot is one bookable facility
+            composite_key=metadata.composite_key,
+            last_refreshed=refreshed_at or datetime.now(),
+            booking_url=None,  # Facility pages need a school/area path the API does not return
+            source_key=source_key,
+        )
+
+    @classmethod
+    def from_schoolhire_week_view_slot(cls, *args, **kwargs) -> "UnifiedParserSchema":
+        return cls.model_construct(**cls.schoolhire_week_view_slot_fields(*args, **kwargs))
+
+    @classmethod
+    def towerhamlets_rolledup_response_fields(
+        cls,
+        response: AggregatedTowerHamletsResponse,
+        metadata: Parameters,
+        source_key: Optional[str] = None,
+        refreshed_at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
         formatted_date = response.date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
         previous_day = response.date - timedelta(days=1)
         formatted_previous_day = previous_day.strftime("%Y-%m-%dT%H:%M:%S.000Z")
 
-        return cls(
+        return dict(
             category=response.category,
             starting_time=response.starting_time,
             ending_time=response.ending_time,
             date=response.date,
             price=response.price,
+            price_pence=parse_price_pence(response.price),
             spaces=response.spaces,
             composite_key=metadata.venue.composite_key,
-            last_refreshed=datetime.now(),
+            last_refreshed=refreshed_at or datetime.now(),
             booking_url=f"https://towerhamletscouncil.gladstonego.cloud/book/calendar/{metadata.activityId}?activityDate={formatted_date}&previousActivityDate={formatted_previous_day}",
+            source_key=source_key,
         )
+
+    @classmethod
+    def from_towerhamlets_rolledup_response(cls, *args, **kwargs) -> "UnifiedParserSchema":
+        return cls.model_construct(**cls.towerhamlets_rolledup_response_fields(*args, **kwargs))
@@ -1,68 +1,76 @@
 import asyncio
+import base64
 import itertools
-from datetime import date, timedelta
-from typing import Any, Coroutine, Dict, List, Tuple
+import json
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
 
-import httpx
+import lxml.html
 from loguru import logger as logging
 from pydantic import ValidationError
+from rich import print
 from sqlmodel import col, select
 
 import sportscanner.storage.postgres.database as db
-from sportscanner.crawlers.anonymize.proxies import httpxAsyncClientWithProxiesAndLimits
-from sportscanner.crawlers.parsers.better.helper import (
-    filter_search_dates_for_allowable,
-)
-from sportscanner.crawlers.parsers.better.schema import BetterApiResponseSchema
+from sportscanner.crawlers.anonymize.proxies import httpxPooledClient
+from sportscanner.crawlers.executor import ParseError, run_parser
+from sportscanner.crawlers.fingerprint import generate_request_key
+from sportscanner.crawlers.parsers.batch import SlotBatch, merge_as_completed
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
-from sportscanner.crawlers.parsers.utils import (
-    formatted_date_list,
-    validate_api_response,
+from sportscanner.crawlers.parsers.schoolhire.helper import group_dates_by_week_startdate
+from sportscanner.crawlers.parsers.schoolhire.schema import (
+    SchoolHireCalendarResponseSchema,
+    SchoolHireWeekViewSlot,
 )
+from sportscanner.crawlers.tracking import tracked_request
+from sportscanner.crawlers.transport import send_request_if_changed
+from sportscanner.crawlers.parsers.utils import formatted_date_list
 from sportscanner.utils import async_timer, timeit
+from prefect import task
+
+TIME_RANGE = re.compile(r"(\d{1,2}:\d{2})\s*(?:-|–|to)\s*(\d{1,2}:\d{2})")
+DAY_OF_MONTH = re.compile(r"\b(\d{1,2})\b")
 
 
 @async_timer
 async def send_concurrent_requests(
     parameter_sets: List[Tuple[db.SportsVenue, date]]
-) -> Tuple[List[UnifiedParserSchema], ...]:
+) -> SlotBatch:
     """Core logic to generate Async tasks and collect responses"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    async with httpxAsyncClientWithProxiesAndLimits() as client:
-        for sports_centre, fetch_date in parameter_sets:
-            async_tasks = create_async_tasks(client, sports_centre, fetch_date)
-            tasks.extend(async_tasks)
-        logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
-        responses = await asyncio.gather(*tasks)
-    return responses
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    client = httpxPooledClient("https://schoolhire.co.uk")
+    for sports_centre, week_start in parameter_sets:
+        async_tasks = create_async_tasks(client, sports_centre, week_start)
+        tasks.extend(async_tasks)
+    logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
+    # Each response's slots are merged into one columnar batch as soon as it is parsed
+    return await merge_as_completed(tasks)
 
 
 def create_async_tasks(
-    client, sports_centre: db.SportsVenue, fetch_date: date
-) -> List[Coroutine[Any, Any, List[UnifiedParserSchema]]]:
-    """Generates Async task for concurrent calls to be made later"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    for activity_duration in ["badminton-40min", "badminton-60min"]:
-        url, headers, _ = generate_api_call_params(
-            sports_centre, fetch_date, activity=activity_duration
-        )
-        tasks.append(fetch_data(client, url, headers))
+    client, sports_centre: db.SportsVenue, week_start: date
+) -> List[Coroutine[Any, Any, SlotBatch]]:
+    """Generates Async task for concurrent calls to be made later; one call covers the week"""
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    url, headers, _ = generate_api_call_params(sports_centre, week_start)
+    source_key = generate_request_key("schoolhire", sports_centre.slug, week_start, "week")
+    tasks.append(
+        fetch_data(client, url, headers, metadata=sports_centre, week_start=week_start, source_key=source_key)
+    )
     return tasks
 
 
-def generate_api_call_params(
-    sports_centre: db.SportsVenue, fetch_date: date, activity: str
-):
+def generate_api_call_params(sports_centre: db.SportsVenue, week_start: date):
     """Generates URL, Headers and Payload information for the API curl request"""
     """https://schoolhire.co.uk/calendar.json?facility_id=28057&date=Thu%2C+23+Jan+2025"""
-    RFC850_date_format = fetch_date.strftime("%a%2C+%d+%b+%Y")
+    RFC850_date_format = week_start.strftime("%a%%2C+%d+%b+%Y")
     url = f"https://schoolhire.co.uk/calendar.json?facility_id={sports_centre.slug}&date={RFC850_date_format}"
     logging.debug(url)
     headers = {
         "accept": "application/json, text/plain, */*",
         "accept-language": "en-US,en;q=0.9",
         "cache-control": "no-cache",
-        "referer": "https://schoolhire.co.uk/london-southwark/notredame/badminton-court/28057?date=",
         "user-agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Mobile Safari/537.36",
     }
     payload: Dict = {}
@@ -70,74 +78,89 @@ def generate_api_call_params(
 
 
 @async_timer
-async def fetch_data(client, url: str, headers: Dict) -> List[UnifiedParserSchema]:
+@tracked_request("schoolhire", name="SchoolHire API")
+async def fetch_data(
+    client, url: str, headers: Dict, metadata: db.SportsVenue, week_start: date, source_key: str
+) -> SlotBatch:
     """Initiates request to server asynchronous using httpx"""
-    response = await client.get(url, headers=headers)
-    content_type = response.headers.get("content-type", "")
-    validated_response = validate_api_response(response, content_type, url)
-    validated_response_data = validated_response.get("data")
-    if validated_response_data is not None:
-        raw_responses_with_schema = apply_raw_response_schema(validated_response_data)
-        return [
-            UnifiedParserSchema.from_better_api_response(response)
-            for response in raw_responses_with_schema
-        ]
-    else:
-        return []
-
-
-def apply_raw_response_schema(api_response) -> List[BetterApiResponseSchema]:
-    aligned_api_response = []
-    if isinstance(api_response, dict):
-        try:
-            aligned_api_response.extend(
-                [
-                    BetterApiResponseSchema(**response_block)
-                    for _key, response_block in api_response.items()
-                ]
-            )
-        except ValidationError as e:
-            logging.error(
-                f"Unable to apply Better API response schema to raw API json:\n{e}"
-            )
-            logging.error(f"{api_response}")
+    response = await send_request_if_changed("schoolhire", client, url, headers, source_key)
+    if response is None:
+        return SlotBatch()
+    if response.status_code != 200:
+        logging.error(f"Request failed: status code {response.status_code}\nURL: {url}\nResponse: {response}")
+        return SlotBatch()
+    return await run_parser(parse_response, response.content, metadata, week_start, source_key)
+
+
+def parse_response(
+    content: bytes, metadata: db.SportsVenue, week_start: date, source_key: str
+) -> SlotBatch:
+    """Decodes the week view and standardises its slots; runs in the parser pool
+
+    Every remaining day of the week is kept, so a week's rows are replaced as a whole under its key
+    """
+    try:
+        calendar = SchoolHireCalendarResponseSchema(**json.loads(content))
+    except ValidationError as e:
+        logging.error(f"Unable to apply SchoolHireCalendarResponseSchema to raw API json:\n{e}")
+        raise ParseError(str(e)) from None
+    week_view_html = base64.b64decode(calendar.base64WeekViewHTML)
+    today = date.today()
+    refreshed_at = datetime.now()
+    slots = SlotBatch()
+    for slot in parse_week_view(week_view_html, week_start):
+        if slot.date >= today:
+            slots.add(**UnifiedParserSchema.schoolhire_week_view_slot_fields(slot, metadata, source_key, refreshed_at))
+    return slots
+
+
+def has_classes(element, *classes: str) -> bool:
+    return set(classes).issubset((element.get("class") or "").split())
+
+
+def column_dates(week_head, week_start: date) -> Dict[int, date]:
+    """Maps column positions of the header to dates, matching each header's day of month
+    against the week, so leading label columns or closed days cannot shift the dates"""
+    days_of_week = {day.day: day for day in (week_start + timedelta(days=i) for i in range(7))}
+    dates: Dict[int, date] = {}
+    for position, header in enumerate(week_head.iterchildren("th", "td")):
+        match = DAY_OF_MONTH.search(header.text_content())
+        if match and int(match.group(1)) in days_of_week:
+            dates[position] = days_of_week[int(match.group(1))]
+    return dates
+
+
+def parse_week_view(week_view_html: bytes, week_start: date) -> List[SchoolHireWeekViewSlot]:
+    """Reads available time ranges per day out of the week view table with lxml"""
+    # The fragment declares no charset, which lxml would read as latin-1 and garble "–" ranges
+    tree = lxml.html.fromstring(week_view_html.decode("utf-8", errors="replace"))
+    week_head = next((row for row in tree.iter("tr") if has_classes(row, "week-head")), None)
+    if week_head is not None:
+        dates = column_dates(week_head, week_start)
     else:
-        if len(api_response) > 0:
-            try:
-                aligned_api_response.extend(
-                    [
-                        BetterApiResponseSchema(**response_block)
-                        for response_block in api_response
-                    ]
-                )
-            except ValidationError as e:
-                logging.error(
-                    f"Unable to apply BetterApiResponseSchema to raw API json:\n{e}"
+        dates = {position: week_start + timedelta(days=position) for position in range(7)}
+    slots: List[SchoolHireWeekViewSlot] = []
+    for row in tree.iter("tr"):
+        if not has_classes(row, "week-element"):
+            continue
+        for position, cell in enumerate(row.iterchildren("th", "td")):
+            slot_date: Optional[date] = dates.get(position)
+            if slot_date is None or not has_classes(cell, "open-day", "availability"):
+                continue
+            for block in cell.iter("div"):
+                if block.find("div") is not None:
+                    continue  # Only innermost blocks, so wrapped slots are not read twice
+                match = TIME_RANGE.search(block.text_content())
+                if match is None:
+                    continue
+                slots.append(
+                    SchoolHireWeekViewSlot(
+                        date=slot_date,
+                        starting_time=datetime.strptime(match.group(1), "%H:%M").time(),
+                        ending_time=datetime.strptime(match.group(2), "%H:%M").time(),
+                    )
                 )
-    logging.debug(f"Data aligned with overall schema: {BetterApiResponseSchema}")
-    return aligned_api_response
-
-
-@timeit
-def fetch_data_across_centres(
-    sports_centre_lists: List[db.SportsVenue], dates: List[date]
-) -> List[UnifiedParserSchema]:
-    """Runs the Async API calls, collects and standardises responses and populate distance/postal
-    metadata"""
-    parameter_sets: List[Tuple[db.SportsVenue, date]] = [
-        (x, y) for x, y in itertools.product(sports_centre_lists, dates)
-    ]
-    logging.debug(
-        f"VENUES: {[sports_centre.venue_name for sports_centre in sports_centre_lists]}"
-    )
-    responses_from_all_sources: Tuple[List[UnifiedParserSchema], ...] = asyncio.run(
-        send_concurrent_requests(parameter_sets)
-    )
-    all_fetched_slots: List[UnifiedParserSchema] = [
-        item for sublist in responses_from_all_sources for item in sublist
-    ]
-    logging.debug(f"Unified parser schema mapped responses:\n{all_fetched_slots}")
-    return all_fetched_slots
+    return slots
 
 
 @timeit
@@ -146,8 +169,9 @@ def get_concurrent_requests(
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
     """Runs the Async API calls, collects and standardises responses and populate distance/postal
     metadata"""
+    week_starts: List[date] = list(group_dates_by_week_startdate(dates).keys())
     parameter_sets: List[Tuple[db.SportsVenue, date]] = [
-        (x, y) for x, y in itertools.product(sports_centre_lists, dates)
+        (x, y) for x, y in itertools.product(sports_centre_lists, week_starts)
     ]
     logging.debug(
         f"VENUES: {[sports_centre.venue_name for sports_centre in sports_centre_lists]}"
@@ -155,35 +179,40 @@ def get_concurrent_requests(
     return send_concurrent_requests(parameter_sets)
 
 
+@task(name="SchoolHire coroutines")
 def pipeline(
-    search_dates: List[date], venue_slugs: List[str]
+    search_dates: List[date], composite_identifiers: List[str]
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
-    allowable_search_dates = filter_search_dates_for_allowable(search_dates)
-    logging.warning(
-        f"Search dates for Better.Org crawler narrowed down to: {formatted_date_list(allowable_search_dates)}"
+    logging.info(
+        f"Search dates for SchoolHire crawler grouped into weeks starting: "
+        f"{formatted_date_list(list(group_dates_by_week_startdate(search_dates).keys()))}"
     )
     sports_centre_lists: List[db.SportsVenue] = db.get_all_rows(
         db.engine,
         table=db.SportsVenue,
         expression=select(db.SportsVenue)
-        .where(db.SportsVenue.organisation_website == "https://www.better.org.uk")
-        .where(col(db.SportsVenue.slug).in_(venue_slugs)),
+        .where(col(db.SportsVenue.composite_key).in_(composite_identifiers))
+        .where(db.SportsVenue.organisation_website == "https://schoolhire.co.uk"),
     )
+    if not sports_centre_lists:
+        logging.warning("No query slugs matching SchoolHire venues")
+        return []
     logging.success(
         f"{len(sports_centre_lists)} Sports venue data queried from database"
     )
-
-    return get_concurrent_requests(sports_centre_lists, allowable_search_dates)
+    return get_concurrent_requests(sports_centre_lists, search_dates)
 
 
 if __name__ == "__main__":
     logging.info("Mocking up input data (user inputs) for pipeline")
     today = date.today()
-    _dates = [today + timedelta(days=i) for i in range(3)]
+    _dates = [today + timedelta(days=i) for i in range(14)]
     sports_venues: List[db.SportsVenue] = db.get_all_rows(
         db.engine,
         db.SportsVenue,
-        select(db.SportsVenue).where(db.SportsVenue.organisation == "better.org.uk"),
+        select(db.SportsVenue).where(db.SportsVenue.organisation_website == "https://schoolhire.co.uk"),
     )
-    venues_slugs = [sports_venue.slug for sports_venue in sports_venues]
-    pipeline(_dates, venues_slugs[:4])
+    composite_identifiers: List[str] = [sports_venue.composite_key for sports_venue in sports_venues]
+    schoolhire_coroutines = pipeline(_dates, composite_identifiers)
+    if schoolhire_coroutines:
+        print(asyncio.run(schoolhire_coroutines))
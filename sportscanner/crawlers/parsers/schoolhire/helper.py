@@ -1,20 +1,21 @@
 from datetime import date, timedelta
-from typing import List
+from typing import Dict, List
 
 
-def filter_search_dates_for_allowable(search_dates: List[date]) -> List[date]:
-    """
-    Filters a list of search dates to only include dates that are also present in the allowable dates list.
+def group_dates_by_week_startdate(dates: List[date]) -> Dict[date, List[date]]:
+    """Groups a list of datetime.date objects into weeks.
 
     Args:
-    search_dates: A list of date objects to be filtered.
-    allowable_dates: A list of date objects representing the allowed dates.
+      dates: A list of datetime.date objects.
 
     Returns:
-    A list of date objects that are present in both the search dates and allowable dates lists.
+      A dictionary where keys are the Monday starting each week and values are lists of dates belonging to that week.
     """
-    today = date.today()
-    allowable_dates = [today + timedelta(days=i) for i in range(6)]
-    return [
-        search_date for search_date in search_dates if search_date in allowable_dates
-    ]
+    weeks = {}
+    for date_obj in dates:
+        # Calculate the start of the week (Monday)
+        weekday = date_obj.weekday()  # Monday is 0, Sunday is 6
+        start_of_week = date_obj - timedelta(days=weekday)
+        weeks.setdefault(start_of_week, []).append(date_obj)
+
+    return weeks
@@ -1,24 +1,18 @@
 """Contains dataclasses for the API call schema"""
 
-from pydantic import BaseModel
-
+from datetime import date, time
+from typing import Optional
 
-class TimeFormat(BaseModel):
-    format_12_hour: str
-    format_24_hour: str
+from pydantic import BaseModel
 
 
-class Price(BaseModel):
-    formatted_amount: str
+class SchoolHireCalendarResponseSchema(BaseModel):
+    renderer: Optional[str] = None
+    base64WeekViewHTML: str
 
 
-class BetterApiResponseSchema(BaseModel):
-    starts_at: TimeFormat
-    ends_at: TimeFormat
-    duration: str
-    price: Price
-    category_slug: str
-    date: str
-    venue_slug: str
-    spaces: int
-    name: str
+class SchoolHireWeekViewSlot(BaseModel):
+    """A bookable slot read off the week view, which carries no price or capacity"""
+    date: date
+    starting_time: time
+    ending_time: time
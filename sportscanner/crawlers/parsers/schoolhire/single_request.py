@@ -6,24 +6,7 @@ import httpx
 from bs4 import BeautifulSoup
 from rich import print
 
-
-def group_dates_by_week_startdate(dates):
-    """Groups a list of datetime.date objects into weeks.
-
-    Args:
-      dates: A list of datetime.date objects.
-
-    Returns:
-      A dictionary where keys are weeks as strings (e.g., "2025-W01") and values are lists of dates belonging to that week.
-    """
-    weeks = {}
-    for date_obj in dates:
-        # Calculate the start of the week (Monday)
-        weekday = date_obj.weekday()  # Monday is 0, Sunday is 6
-        start_of_week = date_obj - timedelta(days=weekday)
-        weeks.setdefault(start_of_week, []).append(date_obj)
-
-    return weeks
+from sportscanner.crawlers.parsers.schoolhire.helper import group_dates_by_week_startdate
 
 
 headers = {
@@ -1,31 +1,107 @@
-from rich import print
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
 from typing import Optional
+
+import jwt
+from loguru import logger as logging
 from playwright.sync_api import sync_playwright
 from rich import print
-import time
 
-# Start Playwright in a headless browser context
-def get_authorization_token() -> Optional[str]:
-    """Returns bearer token needed to authenticate with BeWell servers"""
+from sportscanner.variables import settings
+
+BOOKING_PAGE_URL = "https://towerhamletscouncil.gladstonego.cloud/book"
+
+# Serialises refreshes, so concurrent callers wait for one login rather than each starting one
+_refresh_lock = threading.Lock()
+
+
+def token_expiry(token: str) -> Optional[datetime]:
+    """Reads the `exp` claim of the (JWT) token; the signature is not ours to verify"""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+    expiry = claims.get("exp")
+    return datetime.fromtimestamp(expiry, tz=timezone.utc) if expiry else None
+
+
+def is_token_fresh(token: str) -> bool:
+    """True while the token is valid for at least `TOWERHAMLETS_TOKEN_REFRESH_MARGIN` seconds;
+    tokens without a readable expiry are never reused"""
+    expiry = token_expiry(token)
+    if expiry is None:
+        return False
+    remaining = (expiry - datetime.now(timezone.utc)).total_seconds()
+    return remaining > settings.TOWERHAMLETS_TOKEN_REFRESH_MARGIN
+
+
+def load_cached_token() -> Optional[str]:
+    try:
+        with open(settings.TOWERHAMLETS_TOKEN_CACHE, "r") as file:
+            return json.load(file).get("token")
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_token(token: str):
+    expiry = token_expiry(token)
+    os.makedirs(os.path.dirname(settings.TOWERHAMLETS_TOKEN_CACHE) or ".", exist_ok=True)
+    with open(settings.TOWERHAMLETS_TOKEN_CACHE, "w") as file:
+        json.dump({"token": token, "expires_at": expiry.isoformat() if expiry else None}, file)
+    os.chmod(settings.TOWERHAMLETS_TOKEN_CACHE, 0o600)
+
+
+def fetch_token_with_browser() -> Optional[str]:
+    """Loads the booking page in headless Chromium and reads the token it stores in localStorage"""
     with sync_playwright() as p:
-        # Launch browser (use Chromium, Firefox, or Webkit)
-        browser = p.chromium.launch(
-            headless=True
-        )  # headless=True makes the browser run in the background
-        # Create a new browser page (tab)
-        page = browser.new_page()
-        # Navigate to the target website
-        page.goto(
-            "https://towerhamletscouncil.gladstonego.cloud/book"
-        )
-        # Wait for the page to load (you may need to adjust this depending on the site)
-        time.sleep(1)
-        # Fetch the token from localStorage
-        token: Optional[str] = page.evaluate("window.localStorage.getItem('token');")  # Correct syntax
-        browser.close()
+        browser = p.chromium.launch(headless=True)
+        try:
+            page = browser.new_page()
+            page.goto(BOOKING_PAGE_URL)
+            # Waits for the page's own login call instead of a fixed sleep
+            page.wait_for_function("window.localStorage.getItem('token') !== null", timeout=15_000)
+            return page.evaluate("window.localStorage.getItem('token');")
+        finally:
+            browser.close()
+
+
+def get_authorization_token(rejected: Optional[str] = None) -> Optional[str]:
+    """Returns bearer token needed to authenticate with BeWell servers
+
+    Reuses the locally cached token until shortly before it expires, or until the servers
+    reject it: callers pass the `rejected` bearer token, and only the first of them logs in
+    again while the others pick up its new token
+    """
+    with _refresh_lock:
+        token = load_cached_token()
+        if token and f"Bearer {token}" == rejected:
+            logging.warning("Cached BeWell token was rejected, discarding it")
+            token = None
+        if token and is_token_fresh(token):
+            logging.debug(f"Reusing cached BeWell token, valid until {token_expiry(token)}")
+            return f"Bearer {token}"
+        tic = time.perf_counter()
+        logging.info("Launching headless browser to obtain BeWell token")
+        token = fetch_token_with_browser()
+        if not token:
+            logging.error("Unable to obtain BeWell authorization token")
+            return None
+        logging.info(f"BeWell token refreshed in {time.perf_counter() - tic:.2f}s, valid until {token_expiry(token)}")
+        save_cached_token(token)
         return f"Bearer {token}"
 
+
+async def get_authorization_token_async(rejected: Optional[str] = None) -> Optional[str]:
+    """Awaitable `get_authorization_token`: the (sync Playwright) login runs in a worker thread,
+    so crawls of other providers carry on while it completes"""
+    return await asyncio.to_thread(get_authorization_token, rejected)
+
+
 if __name__ == "__main__":
     print(
         get_authorization_token()
-    )
\ No newline at end of file
+    )
@@ -1,5 +1,6 @@
 import asyncio
 import itertools
+import json
 from datetime import date, timedelta, time
 from typing import Any, Coroutine, Dict, List, Tuple, Optional
 
@@ -11,20 +12,38 @@ from sqlmodel import col, select
 from rich import print
 import sportscanner.storage.postgres.database as db
 from sportscanner.crawlers.helpers import SportscannerCrawlerBot
-from sportscanner.crawlers.parsers.towerhamlets.authenticate import get_authorization_token
-from sportscanner.crawlers.anonymize.proxies import httpxAsyncClient
+from sportscanner.crawlers.parsers.towerhamlets.authenticate import get_authorization_token_async
+from sportscanner.crawlers.anonymize.proxies import httpxPooledClient
+from sportscanner.crawlers.executor import ParseError, run_parser
+from sportscanner.crawlers.fingerprint import generate_request_key
+from sportscanner.crawlers.providers import rolling_month_window
 from sportscanner.crawlers.parsers.citysports.schema import CitySportsResponseSchema
+from sportscanner.crawlers.parsers.batch import SlotBatch, merge_as_completed
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+from sportscanner.crawlers.traffic import is_replaying
+from sportscanner.crawlers.tracking import tracked_request
+from sportscanner.crawlers.transport import send_request_if_changed
 from sportscanner.crawlers.parsers.towerhamlets.mappings import siteIdsActivityIds, HyperlinkGenerator, Parameters
 from sportscanner.crawlers.parsers.utils import validate_api_response
 from sportscanner.utils import async_timer, timeit
-from sportscanner.crawlers.parsers.towerhamlets.schema import TowerHamletsResponseSchema, Location, Slot, AggregatedTowerHamletsResponse
+from sportscanner.variables import settings
+from sportscanner.crawlers.parsers.towerhamlets.rollup import rollup_and_aggregate_data
+from sportscanner.crawlers.parsers.towerhamlets.schema import (
+    AggregatedTowerHamletsResponse,
+    Location,
+    Slot,
+    TowerHamletsResponseSchema,
+    TowerHamletsSessionSchema,
+)
 from prefect import flow, task, get_run_logger
 from collections import defaultdict
 from datetime import datetime, timedelta
 from itertools import chain
 
 
+AUTHENTICATION_FAILURES = {httpx.codes.UNAUTHORIZED, httpx.codes.FORBIDDEN}
+
+
 class HyperlinkWithMetadata(BaseModel):
     siteId: str
     activityId: str
@@ -35,42 +54,56 @@ class HyperlinkWithMetadata(BaseModel):
 async def send_concurrent_requests(
     hyperlinkParameters: List[Parameters],
     search_dates: List[date],
-    token: str
-) -> Tuple[List[UnifiedParserSchema], ...]:
+    batch_size: int = 1,
+) -> SlotBatch:
     """Core logic to generate Async tasks and collect responses"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
-    parameter_sets: List[Tuple[Parameters, date]] = [
-        (x, y) for x, y in itertools.product(hyperlinkParameters, search_dates)
+    # Awaited here rather than in `pipeline`, so only BeWell requests wait on the login
+    # Replayed traffic needs no login, which also keeps offline benchmarks browser-free
+    token: Optional[str] = "Bearer replay" if is_replaying() else await get_authorization_token_async()
+    if token is None:
+        logging.error("No BeWell authorization token, skipping TowerHamlets crawl")
+        return SlotBatch()
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
+    parameter_sets: List[Tuple[List[Parameters], date]] = [
+        (x, y) for x, y in itertools.product(batch_parameters(hyperlinkParameters, batch_size), search_dates)
     ]
-    async with httpxAsyncClient() as client:
-        for hyperlinksAndMetadata, fetch_date in parameter_sets:
-            async_tasks = create_async_tasks(client, hyperlinksAndMetadata, fetch_date, token)
-            tasks.extend(async_tasks)
-        logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-        # Filter out exceptions
-        successful_responses = []
-        for idx, response in enumerate(responses):
-            if isinstance(response, Exception):
-                logging.error(f"Task {idx} failed with error: {response}")
-            else:
-                successful_responses.append(response)
-        # Flatten successful responses (removes nested list layers)
-        flattened_responses = list(itertools.chain.from_iterable(successful_responses))
-    return flattened_responses
+    client = httpxPooledClient("https://towerhamletscouncil.gladstonego.cloud")
+    for batch, fetch_date in parameter_sets:
+        async_tasks = create_async_tasks(client, batch, fetch_date, token)
+        tasks.extend(async_tasks)
+    logging.info(f"Total number of concurrent request tasks: {len(tasks)}")
+    # Each response's slots are merged into one columnar batch as soon as it is parsed
+    return await merge_as_completed(tasks)
+
+
+def batch_parameters(
+    hyperlinkParameters: List[Parameters], batch_size: int
+) -> List[List[Parameters]]:
+    """Packs (site, activity) pairs into batches of up to `batch_size`, one request each"""
+    batch_size = max(1, batch_size)
+    return [hyperlinkParameters[i:i + batch_size] for i in range(0, len(hyperlinkParameters), batch_size)]
 
 
 def create_async_tasks(
-    client, hyperlinksAndMetadata: Parameters, search_date: date, token: str
-) -> List[Coroutine[Any, Any, List[UnifiedParserSchema]]]:
+    client, batch: List[Parameters], search_date: date, token: str
+) -> List[Coroutine[Any, Any, SlotBatch]]:
     """Generates Async task for concurrent calls to be made later"""
-    tasks: List[Coroutine[Any, Any, List[UnifiedParserSchema]]] = []
+    tasks: List[Coroutine[Any, Any, SlotBatch]] = []
     (url, headers, payload) = (
-        generate_url(hyperlinksAndMetadata, search_date),
+        generate_url(batch, search_date),
         generate_headers(token),
-        generate_payload(hyperlinksAndMetadata, search_date)
+        generate_payload(batch, search_date)
+    )
+    # One response covers a rolling month from `search_date`. The planner anchors windows at
+    # today, so the key names the window by its position rather than by a date that moves daily
+    window = f"rolling-month-{rolling_month_window(search_date, date.today())}"
+    source_key = generate_request_key(
+        "towerhamlets",
+        "+".join(parameters.siteId for parameters in batch),
+        window,
+        "+".join(parameters.activityId for parameters in batch),
     )
-    tasks.append(fetch_data(client, url, headers, metadata=hyperlinksAndMetadata))
+    tasks.append(fetch_data(client, url, headers, metadata=batch, source_key=source_key))
     return tasks
 
 
@@ -82,7 +115,7 @@ def generate_headers(token: str) -> Dict:
     }
 
 
-def generate_url(hyperlinksAndMetadata: Parameters, search_date: date) -> str:
+def generate_url(batch: List[Parameters], search_date: date) -> str:
     def format_search_date(unformatted_date: date) -> str:
         now = datetime.now()
         if search_date == now.date():
@@ -92,18 +125,20 @@ def generate_url(hyperlinksAndMetadata: Parameters, search_date: date) -> str:
         return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
 
     formatted_date = format_search_date(search_date)
+    siteIds = ",".join(dict.fromkeys(parameters.siteId for parameters in batch))
+    activityIds = ",".join(dict.fromkeys(parameters.activityId for parameters in batch))
     generated_url: str = (
-        f"https://towerhamletscouncil.gladstonego.cloud/api/availability/V2/sessions?siteIds={hyperlinksAndMetadata.siteId}&activityIDs={hyperlinksAndMetadata.activityId}&webBookableOnly=true&dateFrom={formatted_date}&locationId="
+        f"https://towerhamletscouncil.gladstonego.cloud/api/availability/V2/sessions?siteIds={siteIds}&activityIDs={activityIds}&webBookableOnly=true&dateFrom={formatted_date}&locationId="
     )
     logging.debug(generated_url)
     return generated_url
 
 
-def generate_payload(hyperlinksAndMetadata: Parameters, search_date: date) -> dict:
+def generate_payload(batch: List[Parameters], search_date: date) -> dict:
     formatted_date = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
     generated_payload: dict = {
-        "siteIds": hyperlinksAndMetadata.siteId,
-        "activityIDs": hyperlinksAndMetadata.activityId,
+        "siteIds": ",".join(dict.fromkeys(parameters.siteId for parameters in batch)),
+        "activityIDs": ",".join(dict.fromkeys(parameters.activityId for parameters in batch)),
         "webBookableOnly": True,
         "dateFrom": formatted_date,
         "locationId": None
@@ -113,70 +148,84 @@ def generate_payload(hyperlinksAndMetadata: Parameters, search_date: date) -> di
 
 
 @async_timer
-@task(cache_policy=NO_CACHE, retries=2, name="BeWell API", persist_result=True, retry_delay_seconds=2)
+@tracked_request("towerhamlets", name="BeWell API")
 async def fetch_data(
-    client, url, headers, metadata: Optional[Parameters]
-) -> List[UnifiedParserSchema]:
+    client, url, headers, metadata: List[Parameters], source_key: str
+) -> SlotBatch:
     """Initiates request to server asynchronous using httpx"""
-    logging = get_run_logger()
     logging.debug(f"Fetching data from {url} with headers {headers} and metadata {metadata}")
-    response = await client.get(url, headers=headers)
+    response = await send_request_if_changed("towerhamlets", client, url, headers, source_key)
+    if response is not None and response.status_code in AUTHENTICATION_FAILURES and not is_replaying():
+        # Tokens can be revoked before they expire: log in again once and repeat the request
+        token = await get_authorization_token_async(rejected=headers["Authorization"])
+        if token is not None:
+            headers = {**headers, **generate_headers(token)}
+            response = await send_request_if_changed("towerhamlets", client, url, headers, source_key)
+    if response is None:
+        return SlotBatch()
     response.raise_for_status()  # Ensure non-200 responses are treated as exceptions
-    content_type = response.headers.get("content-type", "")
-    raw_responses_with_schema: List[TowerHamletsResponseSchema] = apply_raw_response_schema(response.json())
-    rolled_up_raw_responses: List[AggregatedTowerHamletsResponse] = rollup_and_aggregate_data(raw_responses_with_schema)
-    return [
-        UnifiedParserSchema.from_towerhamlets_rolledup_response(response, metadata)
-        for response in rolled_up_raw_responses
-    ]
-
+    return await run_parser(parse_response, response.content, metadata, source_key)
 
-def round_to_nearest_minute(time_str) -> datetime:
-    """rounds str date-time to datetime python object"""
-    dt = datetime.fromisoformat(time_str.rstrip("Z"))  # Remove 'Z' and parse as UTC
-    if dt.second > 0:  # Round up if there are any seconds
-        dt = dt.replace(second=0) + timedelta(minutes=1)
-    else:
-        dt = dt.replace(second=0)
-    return dt
 
+def parse_response(
+    content: bytes, metadata: List[Parameters], source_key: str
+) -> SlotBatch:
+    """Decodes, validates, rolls up and standardises a raw response; runs in the parser pool
 
-def aggregate_court_availability(data: List[Slot]) -> List[dict]:
-    aggregated = defaultdict(lambda: {'available': 0})
-    for entry in data:
-        key = (entry.startTime, entry.endTime)
-        if entry.status == 'Available':
-            aggregated[key]['available'] += 1
-
-    result = [
-        {'startTime': k[0], 'endTime': k[1], 'spaces': v['available']}
-        for k, v in aggregated.items()
-    ]
-
-    return result
+    A batched response mixes sessions of several sites and activities; each is handed back to
+    the `Parameters` it was requested for by (`siteId`, `id`), or by `siteId` alone when the
+    batch holds a single activity for that site. Anything else is dropped
+    """
+    if settings.CRAWLER_STRICT_DECODING:
+        raw_responses_with_schema = apply_raw_response_schema(json.loads(content))
+    else:
+        raw_responses_with_schema = decode_available_sessions(json.loads(content))
+    parameters_by_pair: Dict[Tuple[str, str], Parameters] = {
+        (parameters.siteId, parameters.activityId): parameters for parameters in metadata
+    }
+    parameters_by_site: Dict[str, List[Parameters]] = defaultdict(list)
+    for parameters in metadata:
+        parameters_by_site[parameters.siteId].append(parameters)
+    responses_by_pair: Dict[Tuple[str, str], List[TowerHamletsSessionSchema]] = defaultdict(list)
+    for raw_response in raw_responses_with_schema:
+        responses_by_pair[(raw_response.siteId, raw_response.id)].append(raw_response)
+    slots = SlotBatch()
+    refreshed_at = datetime.now()
+    for pair, raw_responses in responses_by_pair.items():
+        parameters = parameters_by_pair.get(pair)
+        if parameters is None and len(parameters_by_site[pair[0]]) == 1:
+            parameters = parameters_by_site[pair[0]][0]
+        if parameters is None:
+            logging.debug(f"Dropping {len(raw_responses)} sessions for unrequested site/activity {pair}")
+            continue
+        rolled_up_raw_responses: List[AggregatedTowerHamletsResponse] = rollup_and_aggregate_data(raw_responses)
+        for response in rolled_up_raw_responses:
+            slots.add(
+                **UnifiedParserSchema.towerhamlets_rolledup_response_fields(response, parameters, source_key, refreshed_at)
+            )
+    return slots
 
 
-def rollup_and_aggregate_data(results: List[TowerHamletsResponseSchema]) -> List[AggregatedTowerHamletsResponse]:
-    rolled_up_results: List[AggregatedTowerHamletsResponse] = []
-    for daily_stats in results:
-        availability_spread_across_courts: List[Location] = daily_stats.locations
-        slots_across_courts: List[List[Slot]] = [x.slots for x in availability_spread_across_courts]
-        flattened_list_of_slots: List[Slot] = list(chain.from_iterable(slots_across_courts))
-        aggregated: List[dict] = aggregate_court_availability(data=flattened_list_of_slots)
-        for slot in aggregated:
-            rounded_start = round_to_nearest_minute(slot.get("startTime"))
-            rounded_end = round_to_nearest_minute(slot.get("endTime"))
-            parsed = AggregatedTowerHamletsResponse(
-                date=datetime.strptime(daily_stats.date, "%Y-%m-%d").date(),
-                category=daily_stats.name,
-                price="£12.80",
-                starting_time=rounded_start.time(),
-                ending_time=rounded_end.time(),
-                spaces=slot.get("spaces")
+def decode_available_sessions(api_response: list) -> List[TowerHamletsSessionSchema]:
+    """Drops booked-out court slots on the raw json, as the rollup only counts available ones,
+    and validates only the session fields it reads"""
+    try:
+        return [
+            TowerHamletsSessionSchema(
+                id=session["id"],
+                siteId=session["siteId"],
+                name=session["name"],
+                date=session["date"],
+                locations=[
+                    {"slots": [slot for slot in location["slots"] if slot.get("status") == "Available"]}
+                    for location in session.get("locations", [])
+                ],
             )
-            rolled_up_results.append(parsed)
-    return rolled_up_results
-
+            for session in api_response
+        ]
+    except (KeyError, TypeError, ValidationError) as e:
+        logging.error(f"Unable to apply TowerHamletsSessionSchema to raw API json:\n{e!r}")
+        raise ParseError(repr(e)) from None
 
 
 def apply_raw_response_schema(api_response: dict) -> List[TowerHamletsResponseSchema]:
@@ -186,15 +235,15 @@ def apply_raw_response_schema(api_response: dict) -> List[TowerHamletsResponseSc
         return aligned_api_response
     except ValidationError as e:
         logging.error(f"Unable to apply BeWellResponseSchema to raw API json:\n{e}")
-        raise ValidationError
+        raise ParseError(str(e)) from None
 
 
 @timeit
 def get_concurrent_requests(
-        hyperlinkParameters: List[Parameters], search_dates: List[date], token: str
+        hyperlinkParameters: List[Parameters], search_dates: List[date], batch_size: int = 1
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
     """Runs the Async API calls, collects and standardises responses and populates distance/postal metadata"""
-    return send_concurrent_requests(hyperlinkParameters, search_dates, token)
+    return send_concurrent_requests(hyperlinkParameters, search_dates, batch_size)
 
 
 
@@ -212,9 +261,10 @@ def generate_parameters_set(hyperlinks: List[HyperlinkGenerator], venues: List[d
 
 @task(name="TowerHamlets coroutines")
 def pipeline(
-    search_dates: List[date], composite_identifiers: List[str]
+    search_dates: List[date], composite_identifiers: List[str], batch_size: int = 1
 ) -> Coroutine[Any, Any, tuple[list[UnifiedParserSchema], ...]]:
-    search_dates: List[date] = [date.today()] # Override parameter as 1 URL response contain Month's data
+    """One response covers a rolling month, so `search_dates` are planned one per month window,
+    and up to `batch_size` (site, activity) pairs share a request, see `crawlers.providers`"""
     sports_centre_lists: List[db.SportsVenue] = db.get_all_rows(
         db.engine,
         table=db.SportsVenue,
@@ -225,14 +275,8 @@ def pipeline(
     logging.success(
         f"{len(sports_centre_lists)} Sports venue data queried from database - fetching for: {search_dates}"
     )
-    authorization_token: str = get_authorization_token()
-    logging.success(authorization_token)
     hyperlinkParameters: List[Parameters] = generate_parameters_set(siteIdsActivityIds, sports_centre_lists)
-    return get_concurrent_requests(
-        hyperlinkParameters,
-        search_dates,
-        token=authorization_token
-    )
+    return get_concurrent_requests(hyperlinkParameters, search_dates, batch_size)
 
 if __name__ == "__main__":
     logging.info("Mocking up input data (user inputs) for pipeline")
@@ -0,0 +1,76 @@
+"""Columnar rollup of BeWell sessions: per-court slots to available courts per time slot
+
+A month of sessions holds thousands of per-court slots; they are flattened into arrays once,
+timestamps are parsed in bulk and counted with array operations, and result objects are only
+built for the aggregated rows
+"""
+
+from datetime import datetime
+from typing import List, Union
+
+import numpy as np
+
+from sportscanner.crawlers.parsers.towerhamlets.schema import (
+    AggregatedTowerHamletsResponse,
+    TowerHamletsResponseSchema,
+    TowerHamletsSessionSchema,
+)
+
+TOWERHAMLETS_COURT_PRICE = "£12.80"
+MINUTE_MS = 60_000
+
+
+def parse_timestamps_ms(timestamps: List[str]) -> np.ndarray:
+    """ISO-8601 UTC strings (`Z` suffixed) to int64 milliseconds since the epoch"""
+    naive = np.array([timestamp.rstrip("Z") for timestamp in timestamps], dtype="datetime64[ms]")
+    return naive.astype(np.int64)
+
+
+def round_up_to_minute(timestamps_ms: np.ndarray) -> np.ndarray:
+    """Drops sub-minute precision, rounding up whenever there are (whole) seconds"""
+    floored = timestamps_ms - timestamps_ms % MINUTE_MS
+    has_seconds = (timestamps_ms % MINUTE_MS) // 1000 > 0
+    return floored + has_seconds * MINUTE_MS
+
+
+def rollup_and_aggregate_data(
+    results: List[Union[TowerHamletsResponseSchema, TowerHamletsSessionSchema]]
+) -> List[AggregatedTowerHamletsResponse]:
+    """Counts available courts per (day, start, end), in first-seen order within each day;
+    time slots without any available court are left out"""
+    day_index, starts, ends = [], [], []
+    for index, daily_stats in enumerate(results):
+        for location in daily_stats.locations:
+            for slot in location.slots:
+                if slot.status == "Available":
+                    day_index.append(index)
+                    starts.append(slot.startTime)
+                    ends.append(slot.endTime)
+    if not day_index:
+        return []
+
+    keys = np.stack(
+        [np.array(day_index, dtype=np.int64), parse_timestamps_ms(starts), parse_timestamps_ms(ends)], axis=1
+    )
+    unique_keys, first_seen, group = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    spaces = np.bincount(group.ravel(), minlength=len(unique_keys))
+
+    # Back to the order the slots were listed in, as the per-row rollup produced
+    order = np.lexsort((first_seen, unique_keys[:, 0]))
+    rounded_starts = round_up_to_minute(unique_keys[order, 1]).astype("datetime64[ms]").astype(datetime)
+    rounded_ends = round_up_to_minute(unique_keys[order, 2]).astype("datetime64[ms]").astype(datetime)
+    days = [datetime.strptime(daily_stats.date, "%Y-%m-%d").date() for daily_stats in results]
+
+    return [
+        AggregatedTowerHamletsResponse.model_construct(
+            date=days[day],
+            category=results[day].name,
+            price=TOWERHAMLETS_COURT_PRICE,
+            starting_time=start.time(),
+            ending_time=end.time(),
+            spaces=int(count),
+        )
+        for day, start, end, count in zip(
+            unique_keys[order, 0].tolist(), rounded_starts, rounded_ends, spaces[order]
+        )
+    ]
@@ -59,6 +59,24 @@ class TowerHamletsResponseSchema(BaseModel):
     locations: List[Location]
 
 
+class SlotTimes(BaseModel):
+    startTime: str
+    endTime: str
+    status: str
+
+class LocationSlots(BaseModel):
+    slots: List[SlotTimes]
+
+class TowerHamletsSessionSchema(BaseModel):
+    """The parts of a session the rollup reads; decoded instead of the full
+    `TowerHamletsResponseSchema` unless `CRAWLER_STRICT_DECODING` is set"""
+    id: str
+    siteId: str
+    name: str
+    date: str
+    locations: List[LocationSlots]
+
+
 class AggregatedTowerHamletsResponse(BaseModel):
     date: date
     category: str
@@ -28,6 +28,27 @@ def validate_api_response(response, content_type: str, url: str):
             return {}
 
 
+def is_json_response(response, content_type: str, url: str) -> bool:
+    """Same checks as `validate_api_response`, without decoding the body on the event loop"""
+    match response.status_code, content_type:
+        case (200, "application/json"):
+            return True
+        case (_, c) if c != "application/json":
+            logging.error(
+                f"Response content-type is not application/json"
+                f"\nURL: {url}"
+                f"\nResponse: {response}"
+            )
+            return False
+        case (_, _):
+            logging.error(
+                f"Request failed: status code {response.status_code}"
+                f"\nURL: {url}"
+                f"\nResponse: {response}"
+            )
+            return False
+
+
 from datetime import date
 
 
@@ -1,95 +1,229 @@
+import argparse
 import asyncio
 import itertools
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from typing import Any, List, Tuple, Union
 
 from loguru import logger as logging
 from prefect.tasks import task_input_hash
 from rich import print
-from sportscanner.crawlers.parsers.better import crawler as BetterOrganisation
-from sportscanner.crawlers.parsers.citysports import crawler as CitySports
-from sportscanner.crawlers.parsers.playground import crawler as Playground
-from sportscanner.crawlers.parsers.towerhamlets import crawler as TowerHamlets
+from sportscanner.crawlers import archive, drift, fingerprint, providers
+from sportscanner.crawlers.anonymize.proxies import clientRegistry
+from sportscanner.crawlers.executor import shutdown_parser_executor
+from sportscanner.crawlers.parsers.better import discovery as BetterDiscovery
+from sportscanner.crawlers.parsers.batch import SlotBatch
 from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+from sportscanner.crawlers.scheduler import FRESHNESS_TIERS, plan_due_dates
+from sportscanner.crawlers.singleflight import singleFlight
+from sportscanner.crawlers.tracking import publish_request_timings, requestTimings
+from sportscanner.crawlers.traffic import traffic_mode
 from sportscanner.storage.postgres.database import (
     PipelineRefreshStatus,
+    SlotStreamWriter,
+    create_db_and_tables,
     delete_all_items_and_insert_fresh_to_db,
     engine,
     get_all_sports_venues,
+    mark_tiers_crawled,
     update_refresh_status_for_pipeline,
 )
 from sportscanner.utils import timeit
-from sportscanner.crawlers.helpers import SportscannerCrawlerBot
+from sportscanner.crawlers.helpers import SportscannerCrawlerBot, SportscannerCrawlerStream
 from prefect import flow, get_run_logger, task
 
 
 @task(name="Validate and flatten responses")
-def flatten_responses(responses_from_all_sources) -> List[UnifiedParserSchema]:
-    _validation_check: List[UnifiedParserSchema] = [
-        slot for response in responses_from_all_sources if response for slot in response
-    ]
-    if not all(isinstance(slot, UnifiedParserSchema) for slot in _validation_check):
-        raise TypeError("One or more elements in `_validation_check` are not of type: `UnifiedParserSchema`")
-    return _validation_check
+def flatten_responses(responses_from_all_sources) -> SlotBatch:
+    """Merges the providers' batches into one; lists of `UnifiedParserSchema` are accepted too"""
+    for response in responses_from_all_sources:
+        if response and not isinstance(response, SlotBatch):
+            if not all(isinstance(slot, UnifiedParserSchema) for slot in response):
+                raise TypeError("One or more elements in a response are not of type: `UnifiedParserSchema`")
+    return SlotBatch.from_responses(response for response in responses_from_all_sources if response)
+
+
+async def drain_schema_drift_validations():
+    """Strict validations run as background tasks and must finish before their loop closes"""
+    monitor = drift.active_monitor()
+    if monitor is not None:
+        await monitor.drain()
+
+
+async def crawl_and_release_pooled_clients(*coroutine_lists) -> List[SlotBatch]:
+    """Runs all crawler coroutines on a short-lived event loop, then closes the pools opened on it"""
+    try:
+        return await SportscannerCrawlerBot(*coroutine_lists)
+    finally:
+        logging.info(f"Request coalescing: {singleFlight.stats()}")
+        await drain_schema_drift_validations()
+        await clientRegistry.aclose()
+
+
+async def stream_and_write_to_db(writer: SlotStreamWriter, *coroutine_lists) -> int:
+    """Hands each crawler's slots to the db writer as they arrive, off the event loop"""
+    try:
+        async for slots in SportscannerCrawlerStream(*coroutine_lists):
+            await asyncio.to_thread(writer.write, slots)
+    finally:
+        logging.info(f"Request coalescing: {singleFlight.stats()}")
+        await drain_schema_drift_validations()
+        await clientRegistry.aclose()
+    return writer.written
+
+
+class RefreshState:
+    """State a refresh carries over between runs: response fingerprints, Better activity
+    discovery and the raw payload archive
+
+    Left out while recording or replaying provider traffic, so those runs parse every response
+    and neither depend on nor overwrite what live refreshes remembered
+    """
+
+    def __init__(self, started_at: datetime):
+        tracked = traffic_mode() is None
+        if not tracked:
+            logging.info(f"Traffic {traffic_mode().value} run: fingerprints, discovery and archive disabled")
+        # Responses identical to the previous refresh are neither parsed nor rewritten
+        self.fingerprints = fingerprint.ResponseFingerprints.load(engine) if tracked else None
+        self.activity_discovery = BetterDiscovery.ActivityDiscovery.load(engine) if tracked else None
+        # Raw payloads are kept so parser fixes can be applied without recrawling
+        self.payload_archive = archive.RawPayloadArchive.for_run(started_at) if tracked else None
+        if self.fingerprints is not None:
+            fingerprint.activate(self.fingerprints)
+        if self.activity_discovery is not None:
+            BetterDiscovery.activate(self.activity_discovery)
+        archive.activate(self.payload_archive)
+
+    @property
+    def unchanged_source_keys(self) -> set:
+        return self.fingerprints.unchanged if self.fingerprints is not None else set()
+
+    def stats(self) -> dict:
+        return self.fingerprints.stats() if self.fingerprints is not None else {}
+
+    def save(self):
+        """Call only once the run's slots have been stored"""
+        if self.fingerprints is not None:
+            self.fingerprints.save(engine)
+        if self.activity_discovery is not None:
+            self.activity_discovery.save(engine)
+        if self.payload_archive is not None:
+            self.payload_archive.close()
 
 
 @flow(name="Srapper pipeline", description="All coroutines launched from here")
 @timeit
-def full_data_refresh_pipeline():
+def full_data_refresh_pipeline(streaming: bool = True):
+    """Set `streaming=False` to collect all slots in memory and load them in one transaction"""
     logging = get_run_logger()
     # update_refresh_status_for_pipeline(engine, PipelineRefreshStatus.RUNNING)
+    started_at = datetime.now()
+    create_db_and_tables(engine)  # Tables and columns added since the database was deployed
     today = date.today()
     dates = [today + timedelta(days=i) for i in range(15)]
     logging.info(f"Finding slots for dates: {dates}")
     sports_venues = get_all_sports_venues(engine)
     composite_identifiers: List[str] = [sports_venue.composite_key for sports_venue in sports_venues]
     logging.info(composite_identifiers)
-    BetterOrganisationCrawlerCoroutines = BetterOrganisation.pipeline(
-        dates, composite_identifiers
-    )
-    CitySportsCrawlerCoroutines = CitySports.pipeline(dates, composite_identifiers)
-    PlaygroundCrawlerCoroutines = Playground.pipeline(dates, composite_identifiers)
-    TowerHamletsCrawlerCoroutines = TowerHamlets.pipeline(dates, composite_identifiers)
-
-    responses_from_all_sources: Tuple[List[UnifiedParserSchema], ...] = asyncio.run(
-        SportscannerCrawlerBot(
-            TowerHamletsCrawlerCoroutines,
-            BetterOrganisationCrawlerCoroutines,
-            CitySportsCrawlerCoroutines,
-            # PlaygroundCrawlerCoroutines
-        )
+    # Each provider only gets the dates it can serve, at the granularity its API works in
+    crawler_coroutines = providers.crawler_coroutines(dates, composite_identifiers)
+    refresh_state = RefreshState(started_at)
+    drift_monitor = drift.SchemaDriftMonitor.load(engine)
+    drift.activate(drift_monitor)
+    if streaming:
+        writer = SlotStreamWriter(engine)
+        total_written: int = asyncio.run(stream_and_write_to_db(writer, *crawler_coroutines))
+        logging.info(f"Total slots collected: {total_written}")
+        logging.info(f"Unchanged responses skipped: {refresh_state.stats()}")
+        writer.finalize(unchanged_source_keys=refresh_state.unchanged_source_keys)
+        refresh_state.save()
+        mark_tiers_crawled(engine, [tier.name for tier in FRESHNESS_TIERS], started_at)
+        publish_request_timings("full-refresh-request-timings")
+        drift_monitor.publish("full-refresh-schema-drift")
+        drift_monitor.save(engine)
+        return True
+
+    responses_from_all_sources: List[SlotBatch] = asyncio.run(
+        crawl_and_release_pooled_clients(*crawler_coroutines)
     )
     # Flatten nested list structure and remove empty or failed responses
-    all_slots: List[UnifiedParserSchema] = flatten_responses(responses_from_all_sources)
+    all_slots: SlotBatch = flatten_responses(responses_from_all_sources)
     # Check if the final list has valid entries
     if not all_slots:
         logging.warning("No valid slots were found. Exiting pipeline.")
     else:
         logging.info(f"Total slots collected: {len(all_slots)}")
-    delete_all_items_and_insert_fresh_to_db(all_slots)
+    logging.info(f"Unchanged responses skipped: {refresh_state.stats()}")
+    delete_all_items_and_insert_fresh_to_db(all_slots, unchanged_source_keys=refresh_state.unchanged_source_keys)
+    refresh_state.save()
+    mark_tiers_crawled(engine, [tier.name for tier in FRESHNESS_TIERS], started_at)
+    publish_request_timings("full-refresh-request-timings")
+    drift_monitor.publish("full-refresh-schema-drift")
+    drift_monitor.save(engine)
     # update_refresh_status_for_pipeline(engine, PipelineRefreshStatus.COMPLETED)
     return True
 
 
+@flow(name="Tiered refresh pipeline", description="Recrawls only the dates whose freshness tier is due")
+@timeit
+def tiered_refresh_pipeline():
+    """Meant to be scheduled at the shortest tier interval; each run crawls the due tiers only"""
+    logging = get_run_logger()
+    started_at = datetime.now()
+    create_db_and_tables(engine)  # Tables and columns added since the database was deployed
+    due_tiers, dates = plan_due_dates(engine, started_at)
+    if not dates:
+        logging.info("All freshness tiers are fresh, nothing to crawl")
+        return False
+    logging.info(f"Tiers due: {[tier.name for tier in due_tiers]} - finding slots for dates: {dates}")
+    sports_venues = get_all_sports_venues(engine)
+    composite_identifiers: List[str] = [sports_venue.composite_key for sports_venue in sports_venues]
+    crawler_coroutines = providers.crawler_coroutines(dates, composite_identifiers)
+    refresh_state = RefreshState(started_at)
+    drift_monitor = drift.SchemaDriftMonitor.load(engine)
+    drift.activate(drift_monitor)
+    writer = SlotStreamWriter(engine, sweep_dates=dates)
+    total_written: int = asyncio.run(stream_and_write_to_db(writer, *crawler_coroutines))
+    logging.info(f"Total slots collected: {total_written}")
+    logging.info(f"Unchanged responses skipped: {refresh_state.stats()}")
+    writer.finalize(unchanged_source_keys=refresh_state.unchanged_source_keys)
+    refresh_state.save()
+    mark_tiers_crawled(engine, [tier.name for tier in due_tiers], started_at)
+    publish_request_timings("tiered-refresh-request-timings")
+    drift_monitor.publish("tiered-refresh-schema-drift")
+    drift_monitor.save(engine)
+    return True
+
+
 @timeit
 async def standalone_refresh_trigger(
     dates: List[date], venues_slugs: List[str]
 ) -> List[UnifiedParserSchema]:
     logging.info(f"Finding slots for dates: {dates}")
-    BetterOrganisationCrawlerCoroutines = BetterOrganisation.pipeline(
-        dates, venues_slugs
-    )
-    CitySportsCrawlerCoroutines = CitySports.pipeline(dates, venues_slugs)
+    crawler_coroutines = providers.crawler_coroutines(dates, venues_slugs, providers=["better", "citysports"])
 
-    all_fetched_slots = await SportscannerCrawlerBot(
-        BetterOrganisationCrawlerCoroutines, CitySportsCrawlerCoroutines
-    )
-    all_slots: List[UnifiedParserSchema] = list(
-        itertools.chain.from_iterable(itertools.chain.from_iterable(all_fetched_slots))
-    )
+    # Pooled clients stay open on the serving event loop, so repeated triggers reuse connections
+    all_fetched_slots = await SportscannerCrawlerBot(*crawler_coroutines)
+    logging.info(f"Pooled httpx client usage: {clientRegistry.stats()}")
+    logging.info(f"Request coalescing: {singleFlight.stats()}")
+    logging.info(f"Request timings: {requestTimings.stats()}")
+    requestTimings.reset()
+    # Each crawler hands back one batch; iterating it yields `UnifiedParserSchema` rows
+    all_slots: List[UnifiedParserSchema] = list(itertools.chain.from_iterable(all_fetched_slots))
     return all_slots
 
 
 if __name__ == "__main__":
     """Gathers data from all sources/providers and loads to SQL database"""
-    full_data_refresh_pipeline()
+    parser = argparse.ArgumentParser(description="Refresh slots from all providers")
+    parser.add_argument(
+        "--tiered", action="store_true", help="Only recrawl the dates whose freshness tier is due"
+    )
+    arguments = parser.parse_args()
+    try:
+        if arguments.tiered:
+            tiered_refresh_pipeline()
+        else:
+            full_data_refresh_pipeline()
+    finally:
+        shutdown_parser_executor()
@@ -0,0 +1,160 @@
+"""Declarative registry of crawl providers and the planner that turns dates into requests
+
+Each provider declares how far ahead it can be booked, how much of the calendar one request
+covers, how many parameter sets one request can batch and its rate limits; `plan_crawl` uses that to hand every crawler only the dates it
+needs to request, instead of each `pipeline()` narrowing the dates on its own
+"""
+
+import importlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from loguru import logger as logging
+
+from sportscanner.crawlers.drift import DEFAULT_VALIDATION_POLICY, ValidationPolicy
+from sportscanner.crawlers.resilience import DEFAULT_RETRY_POLICY, RetryPolicy
+from sportscanner.crawlers.throttle import DEFAULT_LIMITS, ProviderLimits
+
+
+class DateGranularity(Enum):
+    DAY = "day"  # One request per date
+    WEEK = "week"  # One request per calendar week, requested by its Monday
+    MONTH = "month"  # One request covers a rolling month, requested from today
+
+
+ROLLING_MONTH_DAYS = 28
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    name: str
+    module: str  # Crawler module exposing `pipeline(dates, composite_identifiers[, batch_size])`
+    granularity: DateGranularity
+    horizon_days: Optional[int] = None  # Bookable days ahead, counting today; None if unknown
+    batch_size: Optional[int] = None  # Parameter sets packed into one request; None if not batchable
+    limits: ProviderLimits = DEFAULT_LIMITS
+    retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY
+    validation: ValidationPolicy = DEFAULT_VALIDATION_POLICY  # Sampled full-schema validation
+    enabled: bool = True
+
+
+PROVIDERS: Dict[str, ProviderSpec] = {
+    spec.name: spec
+    for spec in [
+        ProviderSpec(
+            name="towerhamlets",
+            module="sportscanner.crawlers.parsers.towerhamlets.crawler",
+            granularity=DateGranularity.MONTH,
+            batch_size=4,  # (site, activity) pairs per sessions request
+            limits=ProviderLimits(max_concurrency=4, requests_per_second=5.0, burst=4),
+            retry_policy=RetryPolicy(max_attempts=2, budget_ratio=0.2, failure_threshold=3),
+            validation=ValidationPolicy(
+                schema="sportscanner.crawlers.parsers.towerhamlets.schema:TowerHamletsResponseSchema",
+                sample_rate=0.05,  # Few, large responses per run
+            ),
+        ),
+        ProviderSpec(
+            name="better",
+            module="sportscanner.crawlers.parsers.better.crawler",
+            granularity=DateGranularity.DAY,
+            horizon_days=6,
+            limits=ProviderLimits(max_concurrency=6, requests_per_second=8.0, burst=6),
+            retry_policy=RetryPolicy(max_attempts=3, budget_ratio=0.2, failure_threshold=8),
+            validation=ValidationPolicy(
+                schema="sportscanner.crawlers.parsers.better.schema:BetterApiResponseSchema", sample_rate=0.01
+            ),
+        ),
+        ProviderSpec(
+            name="citysports",
+            module="sportscanner.crawlers.parsers.citysports.crawler",
+            granularity=DateGranularity.DAY,
+            limits=ProviderLimits(max_concurrency=4, requests_per_second=4.0, burst=4),
+            retry_policy=RetryPolicy(max_attempts=3, budget_ratio=0.3, failure_threshold=4),
+            validation=ValidationPolicy(
+                schema="sportscanner.crawlers.parsers.citysports.schema:CitySportsResponseSchema", sample_rate=0.05
+            ),
+        ),
+        ProviderSpec(
+            name="schoolhire",
+            module="sportscanner.crawlers.parsers.schoolhire.crawler",
+            granularity=DateGranularity.WEEK,
+            limits=ProviderLimits(max_concurrency=2, requests_per_second=2.0, burst=2),
+            retry_policy=RetryPolicy(max_attempts=3, budget_ratio=0.2, failure_threshold=3),
+        ),
+        ProviderSpec(
+            name="playground",
+            module="sportscanner.crawlers.parsers.playground.crawler",
+            granularity=DateGranularity.DAY,
+            limits=ProviderLimits(max_concurrency=2, requests_per_second=2.0, burst=2),
+            retry_policy=RetryPolicy(max_attempts=1),
+            enabled=False,
+        ),
+    ]
+}
+
+
+def get_provider(name: str) -> Optional[ProviderSpec]:
+    return PROVIDERS.get(name)
+
+
+def plan_request_dates(spec: ProviderSpec, dates: List[date], today: date) -> List[date]:
+    """Minimal set of dates to request so that every bookable date in `dates` is covered"""
+    bookable = sorted(
+        {
+            d for d in dates
+            if d >= today and (spec.horizon_days is None or d < today + timedelta(days=spec.horizon_days))
+        }
+    )
+    if not bookable:
+        return []
+    match spec.granularity:
+        case DateGranularity.DAY:
+            return bookable
+        case DateGranularity.WEEK:
+            return sorted({d - timedelta(days=d.weekday()) for d in bookable})
+        case DateGranularity.MONTH:
+            # Windows are anchored at today, so a window's rows are always replaced as a whole
+            windows = {rolling_month_window(d, today) for d in bookable}
+            return [today + timedelta(days=w * ROLLING_MONTH_DAYS) for w in sorted(windows)]
+
+
+def rolling_month_window(request_date: date, today: date) -> int:
+    """Index of the planned rolling month `request_date` opens: 0 for the one from today"""
+    return max(0, (request_date - today).days // ROLLING_MONTH_DAYS)
+
+
+def plan_crawl(
+    dates: List[date], providers: Optional[List[str]] = None, today: Optional[date] = None
+) -> Dict[str, List[date]]:
+    """Dates each enabled provider (or each of `providers`) should request"""
+    today = today or date.today()
+    specs = [PROVIDERS[name] for name in providers] if providers else [
+        spec for spec in PROVIDERS.values() if spec.enabled
+    ]
+    plan = {}
+    for spec in specs:
+        plan[spec.name] = plan_request_dates(spec, dates, today)
+        logging.info(
+            f"Planned {len(plan[spec.name])} request date(s) for {spec.name} "
+            f"({spec.granularity.value} granularity): {[d.isoformat() for d in plan[spec.name]]}"
+        )
+    return plan
+
+
+def crawler_coroutines(
+    dates: List[date], composite_identifiers: List[str], providers: Optional[List[str]] = None
+) -> List[Any]:
+    """Builds the crawl coroutines of the planned providers; crawler modules are imported
+    lazily, as they depend on the throttling and retry modules that this registry configures"""
+    coroutines = []
+    for name, planned_dates in plan_crawl(dates, providers).items():
+        if not planned_dates:
+            continue
+        spec = PROVIDERS[name]
+        crawler = importlib.import_module(spec.module)
+        # Only batchable crawlers' `pipeline` takes a `batch_size`
+        options = {"batch_size": spec.batch_size} if spec.batch_size is not None else {}
+        coroutines.append(crawler.pipeline(planned_dates, composite_identifiers, **options))
+    return coroutines
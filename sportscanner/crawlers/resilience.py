@@ -0,0 +1,120 @@
+"""Retries with exponential backoff and jitter, per-provider retry budgets and circuit breakers"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from loguru import logger as logging
+
+# Upstream hiccups worth another attempt; anything else is returned to the crawler as-is
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3  # Including the first attempt
+    base_delay: float = 0.5  # Seconds, doubled on every attempt
+    max_delay: float = 8.0
+    budget_ratio: float = 0.2  # Retries allowed as a fraction of requests sent in the run
+    budget_minimum: int = 5  # Retries always allowed regardless of the ratio
+    failure_threshold: int = 5  # Consecutive failures that open the circuit
+    cooldown: float = 30.0  # Seconds the circuit stays open before a trial request
+
+
+# Per-provider policies are declared in `sportscanner.crawlers.providers`
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a provider that keeps failing"""
+
+
+class ProviderResilience:
+    """Tracks consecutive failures and the retry budget of a single provider within a run"""
+
+    def __init__(self, provider: str, policy: RetryPolicy):
+        self.provider = provider
+        self.policy = policy
+        self.loop = asyncio.get_running_loop()
+        self.requests: int = 0
+        self.retries: int = 0
+        self.consecutive_failures: int = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None  # Half-open: the one request let through
+
+    def is_open(self) -> bool:
+        """True while requests are refused: during the cooldown, and while its trial request is
+        in flight (one outstanding for longer than a cooldown is presumed lost)"""
+        if self.opened_at is None:
+            return False
+        now = time.monotonic()
+        if now - self.opened_at < self.policy.cooldown:
+            return True
+        return self.trial_started_at is not None and now - self.trial_started_at < self.policy.cooldown
+
+    def before_request(self):
+        """Raises `CircuitOpenError` while the circuit is open; after the cooldown exactly one
+        trial request is let through, whose outcome closes or re-opens the circuit"""
+        if self.is_open():
+            raise CircuitOpenError(
+                f"{self.provider} circuit open after {self.consecutive_failures} consecutive failures"
+            )
+        if self.opened_at is not None:
+            self.trial_started_at = time.monotonic()
+        self.requests += 1
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"{self.provider} is responding again, closing circuit")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_started_at is not None:
+            logging.warning(f"{self.provider} failed its trial request, re-opening circuit")
+            self.trial_started_at = None
+            self.opened_at = time.monotonic()
+        elif self.consecutive_failures >= self.policy.failure_threshold:
+            if self.opened_at is None:
+                logging.error(
+                    f"{self.provider} failed {self.consecutive_failures} times in a row, "
+                    f"opening circuit for {self.policy.cooldown}s"
+                )
+            self.opened_at = time.monotonic()
+
+    def can_retry(self, attempt: int) -> bool:
+        """`attempt` counts from 1; also spends from the provider's retry budget. Refused while
+        the circuit is open, as the retry would be too"""
+        if attempt >= self.policy.max_attempts or self.is_open():
+            return False
+        budget = max(self.policy.budget_minimum, int(self.requests * self.policy.budget_ratio))
+        if self.retries >= budget:
+            logging.warning(f"{self.provider} retry budget of {budget} exhausted")
+            return False
+        self.retries += 1
+        return True
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's `Retry-After`"""
+        ceiling = min(self.policy.max_delay, self.policy.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+
+_providers: Dict[str, ProviderResilience] = {}
+
+
+def get_resilience(provider: str) -> ProviderResilience:
+    """Returns the provider's breaker/budget, reset whenever a new event loop (run) starts"""
+    resilience = _providers.get(provider)
+    if resilience is None or resilience.loop is not asyncio.get_running_loop():
+        from sportscanner.crawlers.providers import get_provider  # The registry imports this module
+
+        spec = get_provider(provider)
+        resilience = ProviderResilience(provider, spec.retry_policy if spec else DEFAULT_RETRY_POLICY)
+        _providers[provider] = resilience
+    return resilience
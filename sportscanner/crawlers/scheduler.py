@@ -0,0 +1,44 @@
+"""Freshness tiers: near-term dates are recrawled more often than far-future ones"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+from loguru import logger as logging
+
+import sportscanner.storage.postgres.database as db
+
+
+@dataclass(frozen=True)
+class FreshnessTier:
+    name: str
+    first_day: int  # Offset from today, inclusive
+    last_day: int  # Offset from today, inclusive
+    interval: timedelta  # Minimum time between two crawls of the tier
+
+    def dates(self, today: date) -> List[date]:
+        return [today + timedelta(days=i) for i in range(self.first_day, self.last_day + 1)]
+
+
+FRESHNESS_TIERS: List[FreshnessTier] = [
+    FreshnessTier(name="today", first_day=0, last_day=0, interval=timedelta(minutes=5)),
+    FreshnessTier(name="near-term", first_day=1, last_day=4, interval=timedelta(minutes=30)),
+    FreshnessTier(name="far-future", first_day=5, last_day=14, interval=timedelta(hours=3)),
+]
+
+
+def plan_due_dates(
+    engine, now: datetime, tiers: List[FreshnessTier] = FRESHNESS_TIERS
+) -> Tuple[List[FreshnessTier], List[date]]:
+    """Returns the tiers whose interval has elapsed since their last crawl, and their dates"""
+    last_crawled: Dict[str, datetime] = db.get_tier_last_crawled(engine)
+    due_tiers = [
+        tier
+        for tier in tiers
+        if tier.name not in last_crawled or now - last_crawled[tier.name] >= tier.interval
+    ]
+    for tier in tiers:
+        if tier not in due_tiers:
+            logging.debug(f"Tier `{tier.name}` is fresh, last crawled at {last_crawled[tier.name]}")
+    due_dates = sorted({d for tier in due_tiers for d in tier.dates(now.date())})
+    return due_tiers, due_dates
@@ -0,0 +1,69 @@
+"""Coalesces identical in-flight requests so concurrent callers share one upstream response"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+def generate_flight_key(method: str, url: str, headers: Dict) -> Tuple:
+    """Normalised URL (sorted query) plus case-insensitive headers"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return (
+        method.upper(),
+        urlunsplit(parts._replace(query=query)),
+        tuple(sorted((k.lower(), v) for k, v in headers.items())),
+    )
+
+
+class SingleFlight:
+    """In-flight map of request key -> pending result
+
+    Uses thread-safe futures, so a crawl on the API's event loop and a full refresh running
+    `asyncio.run` in another thread also share responses
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders: int = 0
+        self.followers: int = 0
+
+    async def do(self, key: Tuple, send: Callable[[], Awaitable[Any]]) -> Any:
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+        if not leader:
+            return await asyncio.wrap_future(pending)
+        try:
+            result = await send()
+        except BaseException as e:
+            pending.set_exception(e)
+            pending.exception()  # Marks the exception retrieved when nobody else was waiting
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "requests": total,
+            "sent_upstream": self.leaders,
+            "coalesced": self.followers,
+            "dedup_ratio": round(self.followers / total, 3) if total else 0.0,
+        }
+
+
+singleFlight = SingleFlight()
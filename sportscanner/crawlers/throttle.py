@@ -0,0 +1,100 @@
+"""Per-provider concurrency caps and token-bucket rate limits for the crawl fan-out"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from loguru import logger as logging
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    max_concurrency: int  # Requests in flight at once against the provider
+    requests_per_second: float  # Sustained token refill rate
+    burst: int  # Bucket capacity, i.e. requests allowed back-to-back
+
+
+# Per-provider limits are declared in `sportscanner.crawlers.providers`
+DEFAULT_LIMITS = ProviderLimits(max_concurrency=4, requests_per_second=4.0, burst=4)
+
+
+class TokenBucket:
+    """Async token bucket; `pause` empties it for a while when the server asks us to back off"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens: float = capacity
+        self.updated_at: float = time.monotonic()
+        self.paused_until: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated_at = now
+
+
+class ProviderThrottle:
+    """Semaphore + token bucket guarding every request sent to a single provider"""
+
+    def __init__(self, provider: str, limits: ProviderLimits):
+        self.provider = provider
+        self.limits = limits
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(limits.max_concurrency)
+        self.bucket = TokenBucket(limits.requests_per_second, limits.burst)
+        self.throttled: int = 0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+    def back_off(self, retry_after: Optional[float]):
+        """Called on HTTP 429; honours `Retry-After` when the provider sends one"""
+        self.throttled += 1
+        seconds = retry_after if retry_after is not None else 1.0 / self.limits.requests_per_second * self.limits.burst
+        logging.warning(f"{self.provider} is rate limiting us, pausing requests for {seconds:.2f}s")
+        self.bucket.pause(seconds)
+
+
+_throttles: Dict[str, ProviderThrottle] = {}
+
+
+def get_throttle(provider: str) -> ProviderThrottle:
+    """Returns the throttle for `provider`, re-created whenever a new event loop is running"""
+    throttle = _throttles.get(provider)
+    if throttle is None or throttle.loop is not asyncio.get_running_loop():
+        from sportscanner.crawlers.providers import get_provider  # The registry imports this module
+
+        spec = get_provider(provider)
+        throttle = ProviderThrottle(provider, spec.limits if spec else DEFAULT_LIMITS)
+        _throttles[provider] = throttle
+    return throttle
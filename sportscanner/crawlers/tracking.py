@@ -0,0 +1,98 @@
+"""Where Prefect tracks a crawl: one task run per HTTP request, or only per provider batch
+
+`CRAWLER_TASK_LEVEL=request` keeps a Prefect task run (with persisted result) for every
+`fetch_data` call. `batch` runs the fetches as plain coroutines, leaving Prefect tracking to the
+provider/batch tasks (`pipeline`, `SportscannerCrawlerBot`) and timing each request in-process.
+Both modes record the same per-request timings, so their overhead can be compared directly.
+"""
+
+import statistics
+import threading
+from enum import Enum
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from loguru import logger as logging
+from prefect import task
+from prefect.artifacts import create_table_artifact
+from prefect.cache_policies import NO_CACHE
+
+from sportscanner.variables import settings
+
+
+class TaskLevel(Enum):
+    REQUEST = "request"
+    BATCH = "batch"
+
+
+def task_level() -> TaskLevel:
+    return TaskLevel(settings.CRAWLER_TASK_LEVEL)
+
+
+class RequestTimings:
+    """Wall-clock duration of every tracked request, per provider, for the current process"""
+
+    def __init__(self):
+        self._durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float):
+        with self._lock:
+            self._durations.setdefault(provider, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            durations = {provider: sorted(values) for provider, values in self._durations.items()}
+        summary = {}
+        for provider, values in durations.items():
+            summary[provider] = {
+                "requests": len(values),
+                "total_s": round(sum(values), 3),
+                "p50_s": round(statistics.median(values), 4),
+                "p95_s": round(values[int(0.95 * (len(values) - 1))], 4),
+                "max_s": round(values[-1], 4),
+            }
+        return summary
+
+
+requestTimings = RequestTimings()
+
+
+def tracked_request(provider: str, name: str):
+    """Decorates an async `fetch_data`; the task level is resolved per call, not at import"""
+
+    def decorator(func: Callable):
+        prefect_task = task(cache_policy=NO_CACHE, name=name, persist_result=True)(func)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            tic = perf_counter()
+            try:
+                if task_level() == TaskLevel.REQUEST:
+                    return await prefect_task(*args, **kwargs)
+                return await func(*args, **kwargs)
+            finally:
+                requestTimings.record(provider, perf_counter() - tic)
+
+        return wrapper
+
+    return decorator
+
+
+def publish_request_timings(artifact_key: str):
+    """Logs this run's per-provider request timings and attaches them to the flow run as one
+    table artifact, then resets them for the next run"""
+    summary = requestTimings.stats()
+    logging.info(f"Request timings ({task_level().value} level tracking): {summary}")
+    if summary:
+        create_table_artifact(
+            key=artifact_key,
+            table=[{"provider": provider, **values} for provider, values in summary.items()],
+            description=f"Per-request timings with `{task_level().value}` level task tracking",
+        )
+    requestTimings.reset()
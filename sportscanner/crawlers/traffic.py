@@ -0,0 +1,163 @@
+"""Record provider traffic to a compressed fixture bundle, and replay it without network access
+
+Set `CRAWLER_TRAFFIC_MODE=record` to capture every request/response made through the pooled
+clients into `CRAWLER_TRAFFIC_BUNDLE` (gzip JSONL), and `CRAWLER_TRAFFIC_MODE=replay` to serve
+those responses locally with the recorded latency, or a fixed `CRAWLER_REPLAY_LATENCY`
+"""
+
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+from loguru import logger as logging
+
+from sportscanner.variables import settings
+
+
+class TrafficMode(Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+# Headers describing the wire encoding of the body, which no longer apply once it is decoded
+_WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+_SENSITIVE_HEADERS = {"authorization", "cookie"}
+_ISO_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2})T[\d:.]+Z?$")
+
+
+def traffic_mode() -> Optional[TrafficMode]:
+    return TrafficMode(settings.CRAWLER_TRAFFIC_MODE) if settings.CRAWLER_TRAFFIC_MODE else None
+
+
+def is_replaying() -> bool:
+    return traffic_mode() == TrafficMode.REPLAY
+
+
+def normalise_url(method: str, url: str) -> str:
+    """Replay lookup key: sorted query params, with timestamps truncated to their date so
+    "from now" requests (e.g. TowerHamlets `dateFrom`) still match their recording"""
+    parts = urlsplit(url)
+    query = sorted(
+        (key, _ISO_TIMESTAMP.sub(r"\1", value))
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    return f"{method} {urlunsplit(parts._replace(query=urlencode(query)))}"
+
+
+class TrafficBundle:
+    """In-memory set of recorded exchanges, persisted as one gzip JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[Dict] = []
+        self._replay_index: Optional[Dict[str, List[Dict]]] = None
+
+    def add(self, request: httpx.Request, response: httpx.Response, content: bytes, elapsed: float):
+        self.records.append(
+            {
+                "key": normalise_url(request.method, str(request.url)),
+                "method": request.method,
+                "url": str(request.url),
+                "request_headers": {
+                    k: v for k, v in request.headers.items() if k.lower() not in _SENSITIVE_HEADERS
+                },
+                "status_code": response.status_code,
+                "headers": {
+                    k: v for k, v in response.headers.items() if k.lower() not in _WIRE_HEADERS
+                },
+                "body": base64.b64encode(content).decode("ascii"),
+                "elapsed": elapsed,
+                "recorded_at": datetime.now().isoformat(),
+            }
+        )
+
+    def flush(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as file:
+            for record in self.records:
+                file.write(json.dumps(record) + "\n")
+        logging.success(f"Recorded {len(self.records)} provider responses to: {self.path}")
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            self.records = [json.loads(line) for line in file if line.strip()]
+        self._replay_index = {}
+        for record in self.records:
+            self._replay_index.setdefault(record["key"], []).append(record)
+        logging.info(f"Loaded {len(self.records)} recorded provider responses from: {self.path}")
+
+    def lookup(self, request: httpx.Request) -> Optional[Dict]:
+        if self._replay_index is None:
+            self.load()
+        matches = self._replay_index.get(normalise_url(request.method, str(request.url)))
+        return matches[-1] if matches else None
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through to the network and keeps a copy of every exchange"""
+
+    def __init__(self, bundle: TrafficBundle, transport: httpx.AsyncBaseTransport):
+        self.bundle = bundle
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tic = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        self.bundle.add(request, response, content, elapsed=time.perf_counter() - tic)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in _WIRE_HEADERS},
+            content=content,
+            request=request,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+        self.bundle.flush()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded responses; unrecorded requests get a 404 so crawlers treat them as failures"""
+
+    def __init__(self, bundle: TrafficBundle, latency: Optional[float] = None):
+        self.bundle = bundle
+        self.latency = latency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        record = self.bundle.lookup(request)
+        if record is None:
+            logging.warning(f"No recorded response for: {request.method} {request.url}")
+            return httpx.Response(status_code=404, request=request)
+        await asyncio.sleep(self.latency if self.latency is not None else record["elapsed"])
+        return httpx.Response(
+            status_code=record["status_code"],
+            headers=record["headers"],
+            content=base64.b64decode(record["body"]),
+            request=request,
+        )
+
+
+_bundle: Optional[TrafficBundle] = None
+
+
+def wrap_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Wraps the real network transport according to `CRAWLER_TRAFFIC_MODE`"""
+    global _bundle
+    mode = traffic_mode()
+    if mode is None:
+        return transport
+    if _bundle is None:
+        _bundle = TrafficBundle(settings.CRAWLER_TRAFFIC_BUNDLE)
+    if mode == TrafficMode.RECORD:
+        return RecordingTransport(_bundle, transport)
+    return ReplayTransport(_bundle, latency=settings.CRAWLER_REPLAY_LATENCY)
@@ -0,0 +1,82 @@
+"""Single entrypoint through which provider crawlers send their HTTP requests"""
+
+import asyncio
+from typing import Dict, Optional
+
+import httpx
+from loguru import logger as logging
+
+from sportscanner.crawlers.fingerprint import active_fingerprints
+from sportscanner.crawlers.resilience import RETRYABLE_STATUS_CODES, get_resilience
+from sportscanner.crawlers.singleflight import generate_flight_key, singleFlight
+from sportscanner.crawlers.throttle import get_throttle
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds requested by the `Retry-After` header (HTTP-date values are ignored)"""
+    retry_after = response.headers.get("retry-after")
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
+
+
+async def send_request(
+    provider: str, client: httpx.AsyncClient, url: str, headers: Dict
+) -> httpx.Response:
+    """GET `url`; identical requests already in flight are awaited rather than sent again"""
+    return await singleFlight.do(
+        generate_flight_key("GET", url, headers),
+        lambda: send_request_with_retries(provider, client, url, headers),
+    )
+
+
+async def send_request_with_retries(
+    provider: str, client: httpx.AsyncClient, url: str, headers: Dict
+) -> httpx.Response:
+    """GET `url` within the provider's concurrency and rate limits, retrying transient
+    failures with backoff while the provider's retry budget and circuit breaker allow"""
+    throttle = get_throttle(provider)
+    resilience = get_resilience(provider)
+    attempt = 1
+    while True:
+        resilience.before_request()
+        retry_after: Optional[float] = None
+        try:
+            async with throttle:
+                response = await client.get(url, headers=headers)
+        except httpx.TransportError as e:
+            resilience.record_failure()
+            if not resilience.can_retry(attempt):
+                raise
+            logging.warning(f"[{provider}] {type(e).__name__} on attempt {attempt}: {url}")
+        else:
+            logging.debug(f"[{provider}] {response.status_code} {url}")
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                resilience.record_success()
+                return response
+            retry_after = parse_retry_after(response)
+            if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+                throttle.back_off(retry_after)
+            resilience.record_failure()
+            if not resilience.can_retry(attempt):
+                return response
+            logging.warning(f"[{provider}] HTTP {response.status_code} on attempt {attempt}: {url}")
+        await asyncio.sleep(resilience.backoff(attempt, retry_after))
+        attempt += 1
+
+
+async def send_request_if_changed(
+    provider: str, client: httpx.AsyncClient, url: str, headers: Dict, source_key: str
+) -> Optional[httpx.Response]:
+    """Like `send_request`, but returns None when the response for `source_key` is identical
+    to the last refresh, so callers can skip parsing and storing it"""
+    fingerprints = active_fingerprints()
+    if fingerprints is None:
+        return await send_request(provider, client, url, headers)
+    headers = {**headers, **fingerprints.conditional_headers(provider, source_key)}
+    response = await send_request(provider, client, url, headers)
+    if fingerprints.is_unchanged(provider, source_key, response):
+        logging.debug(f"[{provider}] Unchanged response, skipping parse: {source_key}")
+        return None
+    return response
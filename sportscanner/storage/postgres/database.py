@@ -4,13 +4,13 @@ import uuid
 from datetime import date, datetime, time, timedelta
 from enum import Enum
 from functools import cache
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from urllib.response import addinfo
 
 import sqlmodel
 from loguru import logger as logging
 from pydantic import UUID4, ValidationError
-from sqlalchemy import Engine, text
+from sqlalchemy import Engine, insert, inspect, or_, text, update
 from sqlmodel import Field, Session, SQLModel, create_engine, delete, select
 
 from sportscanner import config
@@ -22,6 +22,14 @@ from prefect import task
 
 database_name = settings.SQL_DATABASE_NAME
 connection_string = settings.DB_CONNECTION_STRING
+if settings.CRAWLER_TRAFFIC_MODE:
+    # Recorded or replayed traffic must never overwrite the slots served from the live database
+    if not settings.CRAWLER_TRAFFIC_DB_CONNECTION_STRING:
+        raise RuntimeError(
+            f"CRAWLER_TRAFFIC_MODE={settings.CRAWLER_TRAFFIC_MODE} needs a separate database: "
+            "set CRAWLER_TRAFFIC_DB_CONNECTION_STRING"
+        )
+    connection_string = settings.CRAWLER_TRAFFIC_DB_CONNECTION_STRING
 
 engine_configs = {"timeout": 5}
 engine = create_engine(connection_string, pool_pre_ping=True, echo=False)
@@ -43,10 +51,12 @@ class SportScanner(SQLModel, table=True):
     starting_time: time
     ending_time: time
     date: date
-    price: str
+    price: str  # As displayed by the provider
+    price_pence: int | None = Field(default=None, index=True)  # None when the provider shows no price
     spaces: int
     last_refreshed: datetime
     booking_url: str | None
+    source_key: str | None = Field(default=None, index=True)
 
     composite_key: str = Field(default=None, foreign_key="sportsvenue.composite_key")
 
@@ -67,6 +77,42 @@ class SportsVenue(SQLModel, table=True):
     longitude: float
 
 
+class ResponseFingerprint(SQLModel, table=True):
+    """Table containing the digest of the last provider response seen for each request key"""
+
+    request_key: str = Field(primary_key=True)
+    digest: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    last_seen: datetime
+
+
+class TierRefreshMetadata(SQLModel, table=True):
+    """Table containing the last crawl time of each freshness tier"""
+
+    tier: str = Field(primary_key=True)
+    last_crawled: datetime
+
+
+class VenueActivity(SQLModel, table=True):
+    """Table containing which activity slugs a venue was last seen to serve, and when"""
+
+    organisation_website: str = Field(primary_key=True)
+    venue_slug: str = Field(primary_key=True)
+    activity: str = Field(primary_key=True)
+    served: bool
+    checked_at: datetime
+
+
+class ProviderField(SQLModel, table=True):
+    """Table containing the payload fields (dotted paths) each provider was seen to send"""
+
+    provider: str = Field(primary_key=True)
+    field: str = Field(primary_key=True)
+    first_seen: datetime
+    last_seen: datetime
+
+
 class RefreshMetadata(SQLModel, table=True):
     """Table containing Refresh data, and if refresh is in progress"""
 
@@ -134,11 +180,81 @@ def pipeline_refresh_decision_based_on_interval(
         session.commit()
 
 
+def get_tier_last_crawled(engine: Engine) -> dict:
+    """GET last crawl time per freshness tier from TierRefreshMetadata table"""
+    rows: List[TierRefreshMetadata] = get_all_rows(engine, TierRefreshMetadata, select(TierRefreshMetadata))
+    return {row.tier: row.last_crawled for row in rows}
+
+
+def mark_tiers_crawled(engine: Engine, tiers: List[str], crawled_at: datetime):
+    """UPSERT last crawl time for the given freshness tiers"""
+    with Session(engine) as session:
+        for tier in tiers:
+            session.merge(TierRefreshMetadata(tier=tier, last_crawled=crawled_at))
+        session.commit()
+
+
+def get_venue_activities(engine: Engine, organisation_website: str) -> List["VenueActivity"]:
+    """GET discovered activities of an organisation's venues from VenueActivity table"""
+    return get_all_rows(
+        engine,
+        VenueActivity,
+        select(VenueActivity).where(VenueActivity.organisation_website == organisation_website),
+    )
+
+
+def upsert_venue_activities(engine: Engine, venue_activities: List["VenueActivity"]):
+    """UPSERT whether each venue serves an activity, as observed during the latest crawl"""
+    with Session(engine) as session:
+        for venue_activity in venue_activities:
+            session.merge(venue_activity)
+        session.commit()
+
+
+def get_provider_fields(engine: Engine) -> List["ProviderField"]:
+    """GET the payload fields observed so far for every provider from ProviderField table"""
+    return get_all_rows(engine, ProviderField, select(ProviderField))
+
+
+def upsert_provider_fields(engine: Engine, provider_fields: List["ProviderField"]):
+    """UPSERT the payload fields observed during the latest refresh"""
+    with Session(engine) as session:
+        for provider_field in provider_fields:
+            session.merge(provider_field)
+        session.commit()
+
+
+# Indexed columns added to tables after they were first deployed; `create_all` never alters
+# an existing table, so `migrate_tables` adds them
+ADDED_COLUMNS: List[Tuple[sqlmodel.main.SQLModelMetaclass, str]] = [
+    (SportScanner, "source_key"),
+    (SportScanner, "price_pence"),
+]
+
+
+def migrate_tables(engine):
+    """Adds the `ADDED_COLUMNS` missing from existing tables, and their indexes; idempotent"""
+    with engine.begin() as connection:
+        for model, column_name in ADDED_COLUMNS:
+            table = model.__table__
+            column = table.c[column_name]
+            existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+            if column_name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_name} {column_type}"))
+                logging.warning(f"Added column `{column_name}` to existing table: {table.name}")
+            if column.index:
+                connection.execute(
+                    text(f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{column_name} ON {table.name} ({column_name})")
+                )
+
+
 def create_db_and_tables(engine):
     """Creates non-existing tables in db using Class arguments `table=True` which
-    registers SQLModel inheritted class into a Table schema
+    registers SQLModel inheritted class into a Table schema, then migrates existing ones
     """
     SQLModel.metadata.create_all(engine)
+    migrate_tables(engine)
 
 
 def load_sports_centre_mappings(engine):
@@ -209,30 +325,132 @@ def delete_and_insert_slots_to_database(slots_from_all_venues, organisation: str
 @task(name="Load to Postgres")
 @timeit
 def delete_all_items_and_insert_fresh_to_db(
-    slots_from_all_venues
+    slots_from_all_venues, unchanged_source_keys: Optional[set] = None
 ):
-    """Inserts the slots for an Organisation one by one into the table: SportScanner"""
+    """Inserts the slots for an Organisation one by one into the table: SportScanner
+    Rows of `unchanged_source_keys` (responses identical to the last refresh) are kept
+    """
+    unchanged_source_keys = unchanged_source_keys or set()
     with Session(engine) as session:
         statement = delete(SportScanner)
+        if unchanged_source_keys:
+            statement = statement.where(
+                or_(
+                    SportScanner.source_key.is_(None),
+                    SportScanner.source_key.not_in(unchanged_source_keys),
+                )
+            )
         results = session.exec(statement)
+        touch_slots_by_source_key(session, unchanged_source_keys, datetime.now())
         logging.debug(f"Loading fresh data items to db: {len(slots_from_all_venues)}")
-        for slots in slots_from_all_venues:
-            orm_object = SportScanner(
-                uuid=str(uuid.uuid4()),
-                composite_key=slots.composite_key,
-                category=slots.category,
-                starting_time=slots.starting_time,
-                ending_time=slots.ending_time,
-                date=slots.date,
-                price=slots.price,
-                spaces=slots.spaces,
-                last_refreshed=slots.last_refreshed,
-                booking_url=slots.booking_url,
+        insert_slot_rows(session, slot_batch(slots_from_all_venues))
+        session.commit()
+
+
+def slot_batch(slots):
+    """Accepts a `SlotBatch` or any iterable of `UnifiedParserSchema`"""
+    # Imported here as the parser schemas import this module for `SportsVenue`
+    from sportscanner.crawlers.parsers.batch import SlotBatch
+
+    return SlotBatch.of(slots)
+
+
+def insert_slot_rows(session: Session, batch, start: int = 0, stop: Optional[int] = None):
+    """Bulk inserts slots straight from the batch's columns, without building ORM objects"""
+    rows = [{"uuid": str(uuid.uuid4()), **row} for row in batch.rows(start, stop)]
+    if rows:
+        session.connection().execute(insert(SportScanner), rows)
+
+
+def touch_slots_by_source_key(session: Session, source_keys: set, refreshed_at: datetime, chunk_size: int = 500):
+    """Marks rows of unchanged responses as refreshed without rewriting them"""
+    source_keys = list(source_keys)
+    for i in range(0, len(source_keys), chunk_size):
+        session.exec(
+            update(SportScanner)
+            .where(SportScanner.source_key.in_(source_keys[i : i + chunk_size]))
+            .values(last_refreshed=refreshed_at)
+        )
+
+
+def upsert_response_fingerprints(
+    engine: Engine, fingerprints: List[ResponseFingerprint], stale_request_keys: set
+):
+    """Saves the fingerprints observed in the latest refresh and drops `stale_request_keys`"""
+    request_keys = {fingerprint.request_key for fingerprint in fingerprints} | stale_request_keys
+    with Session(engine) as session:
+        keys = list(request_keys)
+        for i in range(0, len(keys), 500):
+            session.exec(
+                delete(ResponseFingerprint).where(ResponseFingerprint.request_key.in_(keys[i : i + 500]))
             )
-            session.add(orm_object)
+        session.add_all(fingerprints)
         session.commit()
 
 
+class SlotStreamWriter:
+    """Writes slots to table: SportScanner in batches as crawlers hand them over
+
+    Each batch replaces the rows previously written for the same request keys, so fresh data
+    is visible as soon as a provider finishes; `finalize` keeps rows of unchanged responses
+    and sweeps everything else not refreshed during this run
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = settings.DB_WRITE_BATCH_SIZE,
+        sweep_dates: Optional[List[date]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.sweep_dates = sweep_dates  # Limits the final sweep to the dates crawled this run
+        self.started_at: datetime = datetime.now()
+        self.replaced_source_keys: set = set()
+        self.written: int = 0
+
+    def write(self, slots):
+        """Inserts slots (a `SlotBatch` or list) in batches of `batch_size`, committing each batch"""
+        slots = slot_batch(slots)
+        for i in range(0, len(slots), self.batch_size):
+            stop = min(i + self.batch_size, len(slots))
+            with Session(self.engine) as session:
+                new_source_keys = slots.distinct_source_keys(i, stop) - self.replaced_source_keys
+                if new_source_keys:
+                    session.exec(
+                        delete(SportScanner)
+                        .where(SportScanner.source_key.in_(new_source_keys))
+                        .where(SportScanner.last_refreshed < self.started_at)
+                    )
+                insert_slot_rows(session, slots, i, stop)
+                session.commit()
+            self.replaced_source_keys |= new_source_keys
+            self.written += stop - i
+        logging.debug(f"Streamed {len(slots)} slots to db, {self.written} written so far")
+
+    def finalize(self, unchanged_source_keys: Optional[set] = None) -> int:
+        """Deletes rows that were not refreshed during this run, and those of past dates which
+        no run sweeps once they leave the crawled range; returns the number deleted"""
+        with Session(self.engine) as session:
+            past = session.exec(delete(SportScanner).where(SportScanner.date < date.today()))
+            session.commit()
+        if not self.written and not unchanged_source_keys:
+            logging.warning("No slots were written during this run, keeping existing rows")
+            return past.rowcount
+        with Session(self.engine) as session:
+            touch_slots_by_source_key(session, unchanged_source_keys or set(), datetime.now())
+            statement = delete(SportScanner).where(SportScanner.last_refreshed < self.started_at)
+            if self.sweep_dates is not None:
+                statement = statement.where(SportScanner.date.in_(self.sweep_dates))
+            result = session.exec(statement)
+            session.commit()
+        logging.info(
+            f"Stream write complete: {self.written} rows written, {result.rowcount} stale rows "
+            f"and {past.rowcount} rows of past dates deleted"
+        )
+        return result.rowcount + past.rowcount
+
+
 def get_all_rows(engine, table: sqlmodel.main.SQLModelMetaclass, expression: select):
     """Returns all rows from full table or selected columns
     Select columns via: select(table.columnA, table.columnB)
@@ -250,6 +468,10 @@ def initialize_db_and_tables(engine):
         engine, refresh_status=PipelineRefreshStatus.OBSOLETE
     )
     truncate_table(engine, table=SportScanner)
+    truncate_table(engine, table=ResponseFingerprint)
+    truncate_table(engine, table=TierRefreshMetadata)
+    truncate_table(engine, table=VenueActivity)
+    truncate_table(engine, table=ProviderField)
     truncate_table(engine, table=SportsVenue)
     load_sports_centre_mappings(engine)
 
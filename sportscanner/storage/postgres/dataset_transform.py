@@ -2,7 +2,7 @@ import json
 from datetime import date, time, timedelta
 from itertools import groupby
 from operator import attrgetter
-from typing import List
+from typing import List, Optional
 
 import httpx
 from PIL.TiffTags import lookup
@@ -47,7 +47,11 @@ def group_slots_by_attributes(slots, attributes):
     return grouped_slots
 
 
-def sort_and_format_grouped_slots_for_ui(grouped_slots, distance_from_venues_reference):
+def sort_and_format_grouped_slots_for_ui(
+    grouped_slots, distance_from_venues_reference, min_price_pence: Optional[dict] = None
+):
+    """`min_price_pence` maps (composite_key, date) to the cheapest available slot's price"""
+    min_price_pence = min_price_pence or {}
     processed_slots: List = []
     for groups in grouped_slots:
         # Sort the groups based on 'date' and 'starting_time'
@@ -97,6 +101,10 @@ def sort_and_format_grouped_slots_for_ui(grouped_slots, distance_from_venues_ref
                     earliest_slot_in_group.composite_key, 99
                 ),
                 "price": earliest_slot_in_group.price,
+                "pricePence": earliest_slot_in_group.price_pence,
+                "minPricePence": min_price_pence.get(
+                    (earliest_slot_in_group.composite_key, earliest_slot_in_group.date)
+                ),
                 "organization": lookup_data.get("organisation", ""),
                 "date": earliest_slot_in_group.date.strftime("%a, %b %d"),
                 "otherSlots": otherSlots,
@@ -15,11 +15,33 @@ env_file = ".env" if os.getenv("ENV") == "prod" else "dev.env"
 class Settings(BaseSettings):
     DB_CONNECTION_STRING: str
     SQL_DATABASE_NAME: str
+    DB_WRITE_BATCH_SIZE: int = 1000
     HTTPX_CLIENT_MAX_CONNECTIONS: int
     HTTPX_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int
     HTTPX_CLIENT_TIMEOUT: float
+    HTTPX_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    HTTPX_CLIENT_HTTP2: bool = False
+    CRAWLER_PARSER_POOL: str = "process"  # "process" | "thread" | "inline"
+    CRAWLER_PARSER_WORKERS: Optional[int] = None  # Defaults to the number of CPUs
+    CRAWLER_TASK_LEVEL: str = "request"  # "request" | "batch", see crawlers/tracking.py
+    CRAWLER_TRAFFIC_MODE: Optional[str] = None  # "record" | "replay"
+    CRAWLER_TRAFFIC_BUNDLE: str = "fixtures/provider-traffic.jsonl.gz"
+    CRAWLER_REPLAY_LATENCY: Optional[float] = None  # Seconds, defaults to recorded latency
+    CRAWLER_TRAFFIC_DB_CONNECTION_STRING: Optional[str] = None  # Required while recording or replaying
+    CRAWLER_STRICT_DECODING: bool = False  # Validate full provider schemas instead of only the fields used
+    CRAWLER_VALIDATION_SAMPLE_RATE: Optional[float] = None  # Overrides providers' rates, see crawlers/drift.py
+    CRAWLER_ARCHIVE_DIR: str = "archive"  # Raw payloads per run, see crawlers/archive.py; empty disables
+    BETTER_ACTIVITY_DISCOVERY_TTL: float = 72.0  # Hours before a venue's activities are re-probed
+    TOWERHAMLETS_TOKEN_CACHE: str = ".cache/towerhamlets-token.json"
+    TOWERHAMLETS_TOKEN_REFRESH_MARGIN: float = 300.0  # Seconds before expiry to refresh
     USE_PROXIES: bool = False
     ROTATING_PROXY_ENDPOINT: str
+    PROXY_POOL: Optional[str] = None  # Comma separated proxy URLs, used instead of the rotating endpoint
+    PROXY_POOL_HEALTHCHECK_URL: str = "https://ipinfo.io/json"
+    PROXY_POOL_WINDOW: int = 20  # Recent requests per proxy the error rate is computed over
+    PROXY_POOL_MIN_REQUESTS: int = 5  # Requests before a proxy can be evicted
+    PROXY_POOL_MAX_ERROR_RATE: float = 0.3
+    PROXY_POOL_EVICTION: float = 120.0  # Seconds before an evicted proxy is probed again
     API_BASE_URL: Optional[str] = "http://localhost:8000/"
     CLOUD_FIRESTORE_CREDENTIALS_PATH: Optional[str]
     CLOUD_FIRESTORE_PROJECT_ID: Optional[str]
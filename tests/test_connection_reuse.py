@@ -0,0 +1,59 @@
+"""Pooled clients must report whether requests reused a kept-alive connection or opened one"""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sportscanner.crawlers.anonymize.proxies import HttpxClientRegistry
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_sequential_requests_reuse_one_connection(server_url):
+    registry = HttpxClientRegistry()
+
+    async def crawl():
+        for _ in range(3):
+            response = await registry.get_client(server_url).get(f"{server_url}/sessions")
+            assert response.status_code == 200
+        await registry.aclose()
+
+    asyncio.run(crawl())
+    assert registry.stats() == {"hosts": 0, "clients_opened": 1, "connections_opened": 1, "connections_reused": 2}
+
+
+def test_new_event_loop_opens_a_new_connection(server_url):
+    registry = HttpxClientRegistry()
+
+    async def crawl():
+        await registry.get_client(server_url).get(server_url)
+
+    asyncio.run(crawl())
+    asyncio.run(crawl())
+    assert registry.clients_opened == 2
+    assert (registry.connections.opened, registry.connections.reused) == (2, 0)
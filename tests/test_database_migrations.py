@@ -0,0 +1,86 @@
+"""Databases deployed before columns were added to `SportScanner` must be upgraded in place"""
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+
+import sportscanner.storage.postgres.database as db
+
+# Table `sportscanner` as first deployed, before `create_all` would create the added columns
+BASELINE_SPORTSCANNER_TABLE = """
+CREATE TABLE sportscanner (
+    uuid VARCHAR NOT NULL PRIMARY KEY,
+    category VARCHAR NOT NULL,
+    starting_time TIME NOT NULL,
+    ending_time TIME NOT NULL,
+    date DATE NOT NULL,
+    price VARCHAR NOT NULL,
+    spaces INTEGER NOT NULL,
+    last_refreshed DATETIME NOT NULL,
+    booking_url VARCHAR,
+    composite_key VARCHAR REFERENCES sportsvenue (composite_key)
+)
+"""
+
+
+def baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE sportsvenue (composite_key VARCHAR NOT NULL PRIMARY KEY)"))
+        connection.execute(text(BASELINE_SPORTSCANNER_TABLE))
+        connection.execute(
+            text(
+                "INSERT INTO sportscanner VALUES "
+                "('a', 'Badminton', '18:00:00', '19:00:00', '2026-01-06', '£12.80', 3, "
+                "'2026-01-05 09:30:00', NULL, NULL)"
+            )
+        )
+    return engine
+
+
+def test_added_columns_and_indexes_are_created_on_existing_table(tmp_path):
+    engine = baseline_engine(tmp_path)
+    db.create_db_and_tables(engine)
+
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("sportscanner")}
+    indexed = {tuple(index["column_names"]) for index in inspector.get_indexes("sportscanner")}
+    for _, column_name in db.ADDED_COLUMNS:
+        assert column_name in columns
+        assert (column_name,) in indexed
+    # Existing rows are kept, with the added columns empty
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT uuid, source_key, price_pence FROM sportscanner")).all()
+    assert rows == [("a", None, None)]
+
+
+def test_unchanged_rows_can_be_touched_on_migrated_table(tmp_path):
+    engine = baseline_engine(tmp_path)
+    db.create_db_and_tables(engine)
+    source_key = "better|venue|2026-01-06|badminton-60min"
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE sportscanner SET source_key = :key"), {"key": source_key})
+    with db.Session(engine) as session:
+        db.touch_slots_by_source_key(session, {source_key}, datetime(2026, 1, 6, 7, 0))
+        session.commit()
+    with engine.connect() as connection:
+        refreshed = connection.execute(text("SELECT last_refreshed FROM sportscanner")).scalar_one()
+    assert refreshed.startswith("2026-01-06 07:00")
+
+
+def test_migration_is_idempotent(tmp_path):
+    engine = baseline_engine(tmp_path)
+    db.create_db_and_tables(engine)
+    db.create_db_and_tables(engine)
+    columns = [column["name"] for column in inspect(engine).get_columns("sportscanner")]
+    assert len(columns) == len(set(columns))
+
+
+def test_fresh_database_needs_no_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    db.create_db_and_tables(engine)
+    indexes = inspect(engine).get_indexes("sportscanner")
+    for _, column_name in db.ADDED_COLUMNS:
+        assert [index["name"] for index in indexes if index["column_names"] == [column_name]] == [
+            f"ix_sportscanner_{column_name}"
+        ]
@@ -0,0 +1,110 @@
+"""The `UnifiedParserSchema.from_*` fast paths skip validation, so they must build exactly the
+slots a validated construction would. Run this file directly for the microbenchmark"""
+
+from datetime import date, datetime, timedelta
+from typing import List
+
+import pytest
+
+from sportscanner.crawlers.parsers.better.schema import BetterApiResponseSchema, Price, TimeFormat
+from sportscanner.crawlers.parsers.schema import SportsVenue, UnifiedParserSchema, parse_price_pence
+
+VENUE = SportsVenue(
+    composite_key="better-a1b2c3",
+    organisation="better",
+    organisation_website="https://www.better.org.uk",
+    venue_name="Venue",
+    slug="venue",
+    postcode="E1 1AA",
+    latitude=51.5,
+    longitude=-0.1,
+)
+
+
+def better_responses(days: int = 14) -> List[BetterApiResponseSchema]:
+    return [
+        BetterApiResponseSchema(
+            starts_at=TimeFormat(format_12_hour="", format_24_hour=f"{hour:02d}:{minute:02d}"),
+            ends_at=TimeFormat(format_12_hour="", format_24_hour=f"{hour + 1:02d}:{minute:02d}"),
+            duration="60min",
+            price=Price(formatted_amount="£12.80"),
+            category_slug="badminton-60min",
+            date=(date.today() + timedelta(days=day)).isoformat(),
+            venue_slug="venue",
+            spaces=4,
+            name="Badminton",
+        )
+        for day in range(days)
+        for hour in range(7, 22)
+        for minute in (0, 20, 40)
+    ]
+
+
+def validated(responses: List[BetterApiResponseSchema]) -> List[UnifiedParserSchema]:
+    """Slots as built before the fast path: validated, parsing every field per slot"""
+    return [
+        UnifiedParserSchema(
+            category=response.name,
+            starting_time=datetime.strptime(response.starts_at.format_24_hour, "%H:%M").time(),
+            ending_time=datetime.strptime(response.ends_at.format_24_hour, "%H:%M").time(),
+            date=datetime.strptime(response.date, "%Y-%m-%d").date(),
+            price=response.price.formatted_amount,
+            price_pence=1280,
+            spaces=response.spaces,
+            composite_key=VENUE.composite_key,
+            last_refreshed=datetime.now(),
+            booking_url="https://bookings.better.org.uk/location/{}/{}/{}/by-time/".format(
+                response.venue_slug,
+                response.category_slug,
+                datetime.strptime(response.date, "%Y-%m-%d").date(),
+            ),
+        )
+        for response in responses
+    ]
+
+
+def fast_path(responses: List[BetterApiResponseSchema]) -> List[UnifiedParserSchema]:
+    refreshed_at = datetime.now()
+    return [
+        UnifiedParserSchema.from_better_api_response(response, VENUE, refreshed_at=refreshed_at)
+        for response in responses
+    ]
+
+
+def test_better_fast_path_matches_validated_construction():
+    responses = better_responses(days=2)
+    expected = [slot.model_dump(exclude={"last_refreshed"}) for slot in validated(responses)]
+    assert [slot.model_dump(exclude={"last_refreshed"}) for slot in fast_path(responses)] == expected
+
+
+def test_better_fast_path_builds_valid_slots():
+    for slot in fast_path(better_responses(days=1)):
+        assert UnifiedParserSchema.model_validate(slot.model_dump()) == slot
+
+
+def test_better_fast_path_shares_refresh_time_across_a_response():
+    assert len({slot.last_refreshed for slot in fast_path(better_responses(days=1))}) == 1
+
+
+@pytest.mark.parametrize(
+    "price, pence",
+    [("£12.80", 1280), ("£12.8", 1280), ("£7", 700), ("£1,250.00", 125000), ("N/A", None), ("", None)],
+)
+def test_parse_price_pence(price, pence):
+    assert parse_price_pence(price) == pence
+
+
+if __name__ == "__main__":
+    """Microbenchmark: validated construction with per-slot parsing against the fast path"""
+    from timeit import timeit
+
+    from loguru import logger as logging
+
+    responses = better_responses()
+    rounds = 20
+    validated_s = timeit(lambda: validated(responses), number=rounds) / rounds
+    fast_path_s = timeit(lambda: fast_path(responses), number=rounds) / rounds
+    logging.info(
+        f"{len(responses)} Better slots: validated {validated_s * 1000:.2f}ms, "
+        f"fast path {fast_path_s * 1000:.2f}ms ({validated_s / fast_path_s:.1f}x)"
+    )
@@ -0,0 +1,44 @@
+"""Raw payloads are appended as they are parsed, so a run that dies keeps what it fetched"""
+
+from datetime import date, datetime
+
+from sportscanner.crawlers.archive import RawPayloadArchive, iter_records, latest_records
+
+STARTED_AT = datetime(2026, 1, 5, 9, 30)
+
+
+def parse_payload(content: bytes, fetch_date: date, source_key: str):
+    """Stands in for a provider parser; only its qualified name is archived"""
+
+
+def add_payloads(archive: RawPayloadArchive, count: int):
+    for index in range(count):
+        archive.add(parse_payload, f"payload-{index}".encode(), (date(2026, 1, 6),), source_key=f"key-{index % 2}")
+
+
+def test_records_are_readable_before_close(tmp_path):
+    archive = RawPayloadArchive(str(tmp_path), STARTED_AT)
+    add_payloads(archive, 3)
+    # Nothing has been closed, as when the run crashes mid-crawl
+    records = list(iter_records(str(tmp_path)))
+    assert [record["source_key"] for record in records] == ["key-0", "key-1", "key-0"]
+    assert records[0]["args"] == [{"__date__": "2026-01-06"}]
+
+
+def test_close_finishes_one_partition_per_provider(tmp_path):
+    archive = RawPayloadArchive(str(tmp_path), STARTED_AT)
+    add_payloads(archive, 4)
+    paths = archive.close()
+    assert paths == [archive.partition_path("test_payload_archive")]
+    assert archive.archived == 4
+    assert len(list(iter_records(str(tmp_path)))) == 4
+    assert {record["content"] for record in latest_records(str(tmp_path))} == {"cGF5bG9hZC0y", "cGF5bG9hZC0z"}
+
+
+def test_truncated_partition_yields_its_complete_records(tmp_path):
+    archive = RawPayloadArchive(str(tmp_path), STARTED_AT)
+    add_payloads(archive, 2)
+    path = archive.partition_path("test_payload_archive")
+    with open(path, "ab") as file:
+        file.write(b"\x00\x01")  # A write cut short by the crash
+    assert len(list(iter_records(str(tmp_path)))) == 2
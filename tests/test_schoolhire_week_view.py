@@ -0,0 +1,48 @@
+"""SchoolHire's week view must be read into the slots it shows as available, under the right dates"""
+
+from datetime import date, time
+from pathlib import Path
+
+import sportscanner.storage.postgres.database as db
+from sportscanner.crawlers.parsers.schoolhire.crawler import generate_api_call_params, parse_week_view
+
+WEEK_VIEW_HTML = (Path(__file__).parent / "fixtures" / "schoolhire_week_view.html").read_bytes()
+WEEK_START = date(2026, 1, 19)
+
+
+def as_tuples(slots):
+    return [(slot.date, slot.starting_time, slot.ending_time) for slot in slots]
+
+
+def test_parse_week_view_reads_available_slots_per_day():
+    assert as_tuples(parse_week_view(WEEK_VIEW_HTML, WEEK_START)) == [
+        (date(2026, 1, 19), time(18, 0), time(19, 0)),
+        (date(2026, 1, 19), time(19, 0), time(20, 0)),
+        (date(2026, 1, 20), time(17, 30), time(18, 30)),  # Wrapped block is read once
+        (date(2026, 1, 22), time(20, 0), time(21, 0)),
+        (date(2026, 1, 24), time(9, 0), time(10, 0)),
+    ]
+
+
+def test_parse_week_view_dates_follow_the_header_days():
+    # Without the label column every day moves one position left, yet keeps its date
+    html = WEEK_VIEW_HTML.replace(b'<th class="label"></th>', b"").replace(
+        b'<th class="label">Badminton Court</th>', b""
+    )
+    assert as_tuples(parse_week_view(html, WEEK_START)) == as_tuples(parse_week_view(WEEK_VIEW_HTML, WEEK_START))
+
+
+def test_week_url_uses_rfc850_week_start():
+    venue = db.SportsVenue(
+        composite_key="schoolhire-28057",
+        organisation="schoolhire",
+        organisation_website="https://schoolhire.co.uk",
+        venue_name="Notre Dame",
+        slug="28057",
+        postcode="SE1 6EX",
+        latitude=51.5,
+        longitude=-0.1,
+    )
+    url, headers, _ = generate_api_call_params(venue, WEEK_START)
+    assert url == "https://schoolhire.co.uk/calendar.json?facility_id=28057&date=Mon%2C+19+Jan+2026"
+    assert headers["accept"].startswith("application/json")
@@ -0,0 +1,115 @@
+"""`SlotBatch` must hand back exactly the slots it was given, however it was assembled"""
+
+import asyncio
+from datetime import date, datetime, time
+
+from sportscanner.crawlers.parsers.batch import SlotBatch, merge_as_completed
+from sportscanner.crawlers.parsers.schema import UnifiedParserSchema
+
+REFRESHED_AT = datetime(2026, 1, 5, 9, 30)
+
+
+def make_slot(
+    composite_key: str = "better-a1b2c3",
+    day: int = 6,
+    hour: int = 18,
+    price: str = "£12.80",
+    price_pence=1280,
+    source_key="better|venue|2026-01-06|badminton-60min",
+    refreshed_at: datetime = REFRESHED_AT,
+) -> UnifiedParserSchema:
+    return UnifiedParserSchema.model_construct(
+        category="Badminton",
+        starting_time=time(hour, 0),
+        ending_time=time(hour, 40, 30),
+        date=date(2026, 1, day),
+        price=price,
+        price_pence=price_pence,
+        spaces=3,
+        composite_key=composite_key,
+        last_refreshed=refreshed_at,
+        booking_url=f"https://bookings.example/{composite_key}/{day}",
+        source_key=source_key,
+    )
+
+
+def dumps(slots):
+    return [slot.model_dump() for slot in slots]
+
+
+def test_round_trip_preserves_every_field():
+    slots = [make_slot(hour=hour) for hour in range(7, 22)] + [make_slot(composite_key="citysports-x", day=7)]
+    assert dumps(SlotBatch.of(slots)) == dumps(slots)
+
+
+def test_rows_are_plain_column_values():
+    batch = SlotBatch.of([make_slot()])
+    assert list(batch.rows()) == [make_slot().model_dump()]
+
+
+def test_missing_price_is_stored_as_sentinel_and_read_back_as_none():
+    slots = [make_slot(price="N/A", price_pence=None), make_slot(price="£0", price_pence=0)]
+    batch = SlotBatch.of(slots)
+    assert list(batch.price_pences) == [-1, 0]
+    assert [row["price_pence"] for row in batch.rows()] == [None, 0]
+    assert dumps(batch) == dumps(slots)
+
+
+def test_optional_strings_round_trip_as_none():
+    slot = make_slot(source_key=None)
+    slot.booking_url = None
+    assert dumps(SlotBatch.of([slot])) == dumps([slot])
+
+
+def test_extend_batch_remaps_interned_values():
+    first = [make_slot(composite_key="a", source_key="key-a"), make_slot(composite_key="shared", source_key=None)]
+    second = [
+        make_slot(composite_key="shared", source_key="key-b", refreshed_at=datetime(2026, 1, 5, 10)),
+        make_slot(composite_key="b", price="£7", price_pence=700, source_key="key-a"),
+    ]
+    merged = SlotBatch.from_responses([SlotBatch.of(first), SlotBatch.of(second)])
+    assert dumps(merged) == dumps(first + second)
+    # Values shared by both batches are interned once
+    assert len(merged.strings.values) == len(set(merged.strings.values))
+    assert merged.timestamps.values == [None, REFRESHED_AT, datetime(2026, 1, 5, 10)]
+
+
+def test_extend_accepts_batches_and_slot_lists():
+    first, second, third = [make_slot(day=6)], [make_slot(day=7)], [make_slot(day=8)]
+    merged = SlotBatch.from_responses([first, SlotBatch.of(second), third])
+    assert dumps(merged) == dumps(first + second + third)
+
+
+def test_rows_slice_and_distinct_source_keys():
+    slots = [make_slot(source_key=key) for key in ["a", "b", None, "a", "c"]]
+    batch = SlotBatch.of(slots)
+    assert len(batch) == 5
+    assert list(batch.rows(1, 3)) == dumps(slots[1:3])
+    assert batch.distinct_source_keys() == {"a", "b", "c"}
+    assert batch.distinct_source_keys(2, 4) == {"a"}
+
+
+def test_add_from_field_values_matches_append():
+    added, appended = SlotBatch(), SlotBatch()
+    for slot in [make_slot(), make_slot(price="N/A", price_pence=None, source_key=None)]:
+        added.add(**slot.model_dump())
+        appended.append(slot)
+    assert dumps(added) == dumps(appended)
+
+
+def test_restamp_replaces_every_refresh_time():
+    batch = SlotBatch.of([make_slot(), make_slot(refreshed_at=datetime(2026, 1, 5, 10))])
+    restamped_at = datetime(2026, 1, 6, 8)
+    assert [row["last_refreshed"] for row in batch.restamp(restamped_at).rows()] == [restamped_at] * 2
+
+
+def test_merge_as_completed_skips_failed_tasks():
+    async def parsed(slots):
+        return SlotBatch.of(slots)
+
+    async def failed():
+        raise ValueError("Unparsable payload")
+
+    first, second = [make_slot(day=6)], [make_slot(day=7), make_slot(day=8)]
+    merged = asyncio.run(merge_as_completed([parsed(first), failed(), parsed(second)]))
+    assert sorted(row["date"] for row in merged.rows()) == [slot.date for slot in first + second]
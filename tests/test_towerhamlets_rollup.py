@@ -0,0 +1,88 @@
+"""The columnar rollup must match the per-row rollup it replaced, row for row and in order"""
+
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import List
+
+from sportscanner.crawlers.parsers.towerhamlets.rollup import rollup_and_aggregate_data
+from sportscanner.crawlers.parsers.towerhamlets.schema import TowerHamletsSessionSchema
+
+
+def round_to_nearest_minute(time_str) -> datetime:
+    dt = datetime.fromisoformat(time_str.rstrip("Z"))
+    if dt.second > 0:
+        dt = dt.replace(second=0) + timedelta(minutes=1)
+    else:
+        dt = dt.replace(second=0)
+    return dt
+
+
+def per_row_rollup(results: List[TowerHamletsSessionSchema]) -> List[tuple]:
+    """The rollup as it was before vectorising, returning comparable tuples"""
+    rolled_up = []
+    for daily_stats in results:
+        aggregated = defaultdict(lambda: {"available": 0})
+        for entry in chain.from_iterable(location.slots for location in daily_stats.locations):
+            if entry.status == "Available":
+                aggregated[(entry.startTime, entry.endTime)]["available"] += 1
+        for (start, end), counts in aggregated.items():
+            rolled_up.append(
+                (
+                    datetime.strptime(daily_stats.date, "%Y-%m-%d").date(),
+                    daily_stats.name,
+                    "£12.80",
+                    round_to_nearest_minute(start).time(),
+                    round_to_nearest_minute(end).time(),
+                    counts["available"],
+                )
+            )
+    return rolled_up
+
+
+def as_tuples(rows) -> List[tuple]:
+    return [(r.date, r.category, r.price, r.starting_time, r.ending_time, r.spaces) for r in rows]
+
+
+def synthetic_month(seed: int = 1, courts: int = 4) -> List[TowerHamletsSessionSchema]:
+    """Sessions with booked and available courts, some starting on odd seconds"""
+    rng = random.Random(seed)
+    sessions = []
+    for day in range(28):
+        session_date = date(2026, 1, 1) + timedelta(days=day)
+        locations = []
+        for _ in range(courts):
+            slots = []
+            for hour in rng.sample(range(7, 22), 12):  # Courts list their slots in different orders
+                seconds = rng.choice([0, 0, 0, 30])
+                slots.append(
+                    {
+                        "startTime": f"{session_date}T{hour:02d}:00:{seconds:02d}Z",
+                        "endTime": f"{session_date}T{hour:02d}:59:59Z",
+                        "status": rng.choice(["Available", "Booked"]),
+                    }
+                )
+            locations.append({"slots": slots})
+        sessions.append(
+            TowerHamletsSessionSchema(
+                id=f"session-{day}", siteId="JOSC", name="Badminton 60", date=str(session_date), locations=locations
+            )
+        )
+    return sessions
+
+
+def test_matches_per_row_rollup():
+    for seed in range(5):
+        results = synthetic_month(seed)
+        assert as_tuples(rollup_and_aggregate_data(results)) == per_row_rollup(results)
+
+
+def test_time_slots_without_available_courts_are_left_out():
+    results = synthetic_month()
+    for session in results:
+        for location in session.locations:
+            for slot in location.slots:
+                slot.status = "Booked"
+    assert rollup_and_aggregate_data(results) == []
+    assert rollup_and_aggregate_data([]) == []